@@ -7,29 +7,56 @@ for the RAG AI Agent.
 
 """
 
-from typing import List, Optional, Dict, Any, Tuple
+from typing import AsyncIterator, List, Optional, Dict, Any, Set, Tuple
+import asyncio
+import hashlib
 import logging
 import json
 import re
-from openai import OpenAI
+from collections import OrderedDict
+import numpy as np
+from openai import AsyncOpenAI
 
 from .models import VectorChunk, ChatMessage
 from .config import get_settings
 from .query import get_query_processor
-from .memory import get_memory_manager
+from .memory import fit_token_budget, get_memory_manager
 
 logger = logging.getLogger(__name__)
 
+# [Source X] / [Source X, Y] citation markers in generated responses
+_SOURCE_CITATION_RE = re.compile(r'\[Source\s+(\d+(?:,\s*\d+)*)\]', re.IGNORECASE)
+
+# Background chat turn writes; the event loop only keeps weak references to tasks
+_pending_writes: Set[asyncio.Task] = set()
+
+
+def _log_if_error(task: asyncio.Task) -> None:
+    """Done callback for background chat turn writes."""
+    _pending_writes.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Failed to store conversation turn: {task.exception()}")
+
 
 class ChatOrchestrator:
     """Orchestrates LLM response generation with context and citations."""
     
+    # Semantic response cache: a query whose embedding is this similar to a
+    # cached one, asked over the same sources and history, reuses its answer
+    RESPONSE_CACHE_SIZE = 256
+    RESPONSE_CACHE_SIMILARITY = 0.97
+    
+    # Earlier turns sent back to the model; older ones only add input tokens
+    MAX_HISTORY_TURNS = 6
+    MAX_HISTORY_TOKENS = 2000
+    
     def __init__(self):
-        """Initialize the chat orchestrator with OpenAI client."""
+        """Initialize the chat orchestrator with an async OpenAI client."""
         self.config = get_settings()
-        self.openai_client = OpenAI(api_key=self.config.openai_api_key)
+        self.openai_client = AsyncOpenAI(api_key=self.config.openai_api_key)
         self.query_processor = get_query_processor()
         self.memory_manager = get_memory_manager()
+        self._response_cache: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, str]]" = OrderedDict()
     
     async def generate_response(
         self,
@@ -67,7 +94,7 @@ class ChatOrchestrator:
             )
             
             # Generate response
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model=model,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -94,12 +121,53 @@ class ChatOrchestrator:
             logger.error(f"Failed to generate response: {e}")
             raise
     
+    async def prepare_context(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int = 4,
+        similarity_threshold: float = 0.7,
+        chat_history: Optional[List[ChatMessage]] = None
+    ) -> Tuple[List[VectorChunk], List[ChatMessage]]:
+        """
+        Retrieve document context and chat history concurrently.
+        
+        The document search and the chat memory lookup are independent
+        network round-trips, so they run together instead of back to back.
+        
+        Args:
+            query: User's question
+            session_id: Chat session identifier
+            top_k: Number of document chunks to retrieve
+            similarity_threshold: Minimum similarity for retrieval
+            chat_history: History the caller already holds; when given, chat
+                memory is not read from the database
+            
+        Returns:
+            Tuple of (context_chunks, chat_history), with the history trimmed
+            to the newest turns that fit MAX_HISTORY_TOKENS
+        """
+        if chat_history is not None:
+            context_chunks = await self.query_processor.search_documents(
+                query, top_k=top_k, similarity_threshold=similarity_threshold
+            )
+            return context_chunks, fit_token_budget(chat_history, self.MAX_HISTORY_TOKENS)
+        
+        context_chunks, chat_history = await asyncio.gather(
+            self.query_processor.search_documents(
+                query, top_k=top_k, similarity_threshold=similarity_threshold
+            ),
+            self.memory_manager.get_chat_memory(session_id, token_budget=self.MAX_HISTORY_TOKENS)
+        )
+        return context_chunks, chat_history
+    
     async def process_query(
         self,
         query: str,
         session_id: str,
         top_k: int = 4,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        chat_history: Optional[List[ChatMessage]] = None
     ) -> Tuple[str, List[VectorChunk]]:
         """
         Complete query processing workflow: search, retrieve context, generate response.
@@ -109,6 +177,7 @@ class ChatOrchestrator:
             session_id: Chat session identifier
             top_k: Number of document chunks to retrieve
             similarity_threshold: Minimum similarity for retrieval
+            chat_history: Optional history already held by the caller
             
         Returns:
             Tuple of (generated_response, source_chunks)
@@ -119,45 +188,245 @@ class ChatOrchestrator:
         logger.info(f"Processing query for session {session_id[:8]}...")
         
         try:
-            # Step 1: Retrieve relevant document chunks
-            context_chunks = await self.query_processor.search_documents(
-                query, top_k=top_k, similarity_threshold=similarity_threshold
+            # Steps 1-2: Retrieve relevant document chunks and chat history
+            context_chunks, chat_history = await self.prepare_context(
+                query, session_id, top_k=top_k, similarity_threshold=similarity_threshold,
+                chat_history=chat_history
             )
             
-            # Step 2: Get chat history for context
-            chat_history = await self.memory_manager.get_chat_memory(session_id)
+            # Step 3: Generate response with context, unless a near-identical
+            # query was already answered from the same context
+            context_key = self._response_context_key(context_chunks, chat_history)
+            response, query_embedding = await self._get_cached_response(query, context_key)
+            
+            if response is None:
+                if context_chunks:
+                    response = await self.generate_response(
+                        query, context_chunks, chat_history
+                    )
+                else:
+                    # Fallback response when no relevant documents found
+                    response = await self._generate_fallback_response(query, chat_history)
+                    logger.warning("No relevant documents found, using fallback response")
+                
+                self._cache_response(context_key, query, query_embedding, response)
             
-            # Step 3: Generate response with context
-            if context_chunks:
-                response = await self.generate_response(
-                    query, context_chunks, chat_history
+            # Step 4: Store the conversation turn without delaying the response
+            self._store_turn_in_background(session_id, query, response, context_chunks)
+            
+            logger.info(f"Successfully processed query for session {session_id[:8]}...")
+            return response, context_chunks
+            
+        except Exception as e:
+            logger.error(f"Failed to process query: {e}")
+            raise
+    
+    async def process_query_stream(
+        self,
+        query: str,
+        session_id: str,
+        top_k: int = 4,
+        similarity_threshold: float = 0.7,
+        sources: Optional[List[VectorChunk]] = None,
+        chat_history: Optional[List[ChatMessage]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streaming variant of process_query that yields the response as it is generated.
+        
+        Args:
+            query: User's question
+            session_id: Chat session identifier
+            top_k: Number of document chunks to retrieve
+            similarity_threshold: Minimum similarity for retrieval
+            sources: Optional list that receives the retrieved source chunks
+                before the first text delta is yielded
+            chat_history: Optional history already held by the caller
+            
+        Yields:
+            Response text deltas
+            
+        Raises:
+            Exception: If query processing fails
+        """
+        logger.info(f"Processing streamed query for session {session_id[:8]}...")
+        
+        try:
+            context_chunks, chat_history = await self.prepare_context(
+                query, session_id, top_k=top_k, similarity_threshold=similarity_threshold,
+                chat_history=chat_history
+            )
+            if sources is not None:
+                sources.extend(context_chunks)
+            
+            context_key = self._response_context_key(context_chunks, chat_history)
+            cached_response, query_embedding = await self._get_cached_response(query, context_key)
+            
+            if cached_response is not None:
+                response = cached_response
+                yield response
+            elif context_chunks:
+                messages = self._build_conversation_messages(
+                    query, self._build_context_string(context_chunks), chat_history
+                )
+                stream = await self.openai_client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    max_tokens=1000,
+                    temperature=0.1,
+                    stream=True
                 )
+                
+                parts = []
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                
+                response = "".join(parts)
+                if not response.strip():
+                    raise Exception("Empty response from OpenAI")
             else:
-                # Fallback response when no relevant documents found
                 response = await self._generate_fallback_response(query, chat_history)
                 logger.warning("No relevant documents found, using fallback response")
+                yield response
             
-            # Step 4: Store the conversation turn
-            await self.memory_manager.store_chat_turn(
-                session_id=session_id,
-                user_message=query,
-                ai_response=response,
-                metadata={
-                    'retrieved_chunks': len(context_chunks),
-                    'similarity_scores': [
-                        chunk.metadata.get('similarity_score', 0.0) 
-                        for chunk in context_chunks
-                    ] if context_chunks else []
-                }
-            )
+            if cached_response is None:
+                self._cache_response(context_key, query, query_embedding, response)
             
-            logger.info(f"Successfully processed query for session {session_id[:8]}...")
-            return response, context_chunks
+            self._store_turn_in_background(session_id, query, response, context_chunks)
+            
+            logger.info(f"Successfully streamed query for session {session_id[:8]}...")
             
         except Exception as e:
-            logger.error(f"Failed to process query: {e}")
+            logger.error(f"Failed to process streamed query: {e}")
             raise
     
+    def _response_context_key(
+        self,
+        context_chunks: List[VectorChunk],
+        chat_history: List[ChatMessage]
+    ) -> str:
+        """
+        Hash what a response depends on besides the query itself.
+        
+        Args:
+            context_chunks: Retrieved document chunks
+            chat_history: Previous conversation turns
+            
+        Returns:
+            Hex digest of the source chunk IDs and the conversation history
+        """
+        state = json.dumps(
+            [
+                [str(chunk.id) for chunk in context_chunks],
+                [(msg.user_message, msg.ai_response) for msg in chat_history]
+            ],
+            separators=(",", ":")
+        )
+        return hashlib.blake2b(state.encode()).hexdigest()
+    
+    async def _get_cached_response(
+        self,
+        query: str,
+        context_key: str
+    ) -> Tuple[Optional[str], np.ndarray]:
+        """
+        Look up a cached response for a semantically similar query.
+        
+        The query embedding is already cached by the query processor from
+        the document search, so this makes no API call.
+        
+        Args:
+            query: User's question
+            context_key: Result of _response_context_key
+            
+        Returns:
+            Tuple of (cached response or None, normalized query embedding)
+        """
+        embedding = np.asarray(await self.query_processor.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm:
+            embedding = embedding / norm
+        
+        hit = None
+        for key, (cached_embedding, _) in reversed(self._response_cache.items()):
+            if key[0] == context_key and float(np.dot(embedding, cached_embedding)) >= self.RESPONSE_CACHE_SIMILARITY:
+                hit = key
+                break
+        
+        if hit is None:
+            return None, embedding
+        
+        logger.info("Reusing cached response for a semantically similar query")
+        self._response_cache.move_to_end(hit)
+        return self._response_cache[hit][1], embedding
+    
+    def _cache_response(
+        self,
+        context_key: str,
+        query: str,
+        query_embedding: np.ndarray,
+        response: str
+    ) -> None:
+        """Cache a response, evicting the least recently used entry."""
+        self._response_cache[(context_key, query)] = (query_embedding, response)
+        self._response_cache.move_to_end((context_key, query))
+        if len(self._response_cache) > self.RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+    
+    def _store_turn_in_background(
+        self,
+        session_id: str,
+        query: str,
+        response: str,
+        context_chunks: List[VectorChunk]
+    ) -> asyncio.Task:
+        """
+        Schedule storing a conversation turn on the running event loop.
+        
+        Failures are logged rather than raised, since the response has
+        already been returned to the user.
+        
+        Args:
+            session_id: Chat session identifier
+            query: User's question
+            response: Generated response
+            context_chunks: Document chunks the response was based on
+            
+        Returns:
+            The scheduled task
+        """
+        task = asyncio.create_task(self.memory_manager.store_chat_turn(
+            session_id=session_id,
+            user_message=query,
+            ai_response=response,
+            metadata=self._build_turn_metadata(context_chunks)
+        ))
+        _pending_writes.add(task)
+        task.add_done_callback(_log_if_error)
+        return task
+    
+    def _build_turn_metadata(self, context_chunks: List[VectorChunk]) -> Dict[str, Any]:
+        """
+        Build the metadata stored with a conversation turn.
+        
+        Args:
+            context_chunks: Document chunks the response was based on
+            
+        Returns:
+            Metadata dictionary for the turn
+        """
+        return {
+            'retrieved_chunks': len(context_chunks),
+            'similarity_scores': [
+                chunk.metadata.get('similarity_score', 0.0) 
+                for chunk in context_chunks
+            ] if context_chunks else []
+        }
+    
     def _build_context_string(self, chunks: List[VectorChunk]) -> str:
         """
         Build context string from retrieved chunks with source information.
@@ -171,16 +440,12 @@ class ChatOrchestrator:
         if not chunks:
             return "No relevant documents found."
         
-        context_parts = []
-        for i, chunk in enumerate(chunks, 1):
-            # Get document filename from metadata or use doc_id
-            source = chunk.metadata.get('filename', f"Document {chunk.doc_id}")
-            similarity = chunk.metadata.get('similarity_score', 0.0)
-            
-            context_part = f"[Source {i}: {source} (Similarity: {similarity:.3f})]\n{chunk.content}\n"
-            context_parts.append(context_part)
-        
-        return "\n".join(context_parts)
+        # Filename falls back to the doc_id when metadata lacks it
+        return "\n".join(
+            f"[Source {i}: {chunk.metadata.get('filename', f'Document {chunk.doc_id}')} "
+            f"(Similarity: {chunk.metadata.get('similarity_score', 0.0):.3f})]\n{chunk.content}\n"
+            for i, chunk in enumerate(chunks, 1)
+        )
     
     def _build_conversation_messages(
         self,
@@ -206,7 +471,7 @@ class ChatOrchestrator:
         messages.append({"role": "system", "content": system_prompt})
         
         # Add chat history (limited to recent messages)
-        for msg in chat_history[-10:]:  # Keep last 10 messages for context
+        for msg in chat_history[-self.MAX_HISTORY_TURNS:]:
             # Add user message
             messages.append({
                 "role": "user",
@@ -301,7 +566,7 @@ Provide a helpful response that:
         })
         
         try:
-            response = self.openai_client.chat.completions.create(
+            response = await self.openai_client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=messages,
                 max_tokens=500,
@@ -332,11 +597,8 @@ Provide a helpful response that:
         citations = []
         
         # Find all [Source X] patterns
-        citation_pattern = r'\[Source\s+(\d+(?:,\s*\d+)*)\]'
-        matches = re.finditer(citation_pattern, response_text, re.IGNORECASE)
-        
-        for match in matches:
-            source_numbers = [int(x.strip()) for x in match.group(1).split(',')]
+        for match in _SOURCE_CITATION_RE.finditer(response_text):
+            source_numbers = [int(x) for x in match.group(1).split(',')]
             citations.append({
                 'text': match.group(0),
                 'position': match.span(),
@@ -406,6 +668,17 @@ async def generate_response(
     return await orchestrator.generate_response(query, context_chunks, chat_history)
 
 
+async def prepare_context(
+    query: str,
+    session_id: str,
+    top_k: int = 4,
+    similarity_threshold: float = 0.7
+) -> Tuple[List[VectorChunk], List[ChatMessage]]:
+    """Retrieve document context and chat history concurrently."""
+    orchestrator = get_chat_orchestrator()
+    return await orchestrator.prepare_context(query, session_id, top_k, similarity_threshold)
+
+
 async def process_query(
     query: str,
     session_id: str,
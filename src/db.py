@@ -1,9 +1,11 @@
 """Supabase client and database helpers for the RAG AI Agent."""
 
 import logging
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
+from postgrest.exceptions import APIError
 from supabase import create_client, Client
 from supabase.lib.client_options import ClientOptions
 
@@ -13,6 +15,9 @@ from .models import Document, VectorChunk, ChatMessage
 
 logger = logging.getLogger(__name__)
 
+# Postgres SQLSTATE for a unique index violation
+UNIQUE_VIOLATION = "23505"
+
 
 class SupabaseClient:
     """Wrapper for Supabase client with RAG-specific operations."""
@@ -53,9 +58,7 @@ class SupabaseClient:
     def create_document(self, filename: str) -> Document:
         """Create a new document record."""
         try:
-            result = self.client.table("documents").insert({
-                "filename": filename
-            }).execute()
+            result = self.client.table("documents").insert({"filename": filename}).execute()
             
             if result.data:
                 doc_data = result.data[0]
@@ -89,6 +92,49 @@ class SupabaseClient:
             logger.error(f"Error getting document {doc_id}: {e}")
             raise
     
+    def get_document_by_sha256(self, content_sha256: str) -> Optional[Document]:
+        """Get the document whose file content has the given SHA-256 digest."""
+        try:
+            result = self.client.table("documents").select(
+                "id,filename,uploaded_at"
+            ).eq("content_sha256", content_sha256).limit(1).execute()
+            
+            if result.data:
+                doc_data = result.data[0]
+                return Document(
+                    id=UUID(doc_data["id"]),
+                    filename=doc_data["filename"],
+                    uploaded_at=doc_data["uploaded_at"]
+                )
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error looking up document by digest {content_sha256}: {e}")
+            raise
+    
+    def set_document_sha256(self, doc_id: UUID, content_sha256: str) -> bool:
+        """
+        Record the content digest of a fully ingested document.
+        
+        Returns False when another document already holds the digest, which
+        the unique index on content_sha256 reports as a unique violation.
+        """
+        try:
+            self.client.table("documents").update(
+                {"content_sha256": content_sha256}
+            ).eq("id", str(doc_id)).execute()
+            return True
+            
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                logger.info(f"Digest {content_sha256} is already held by another document")
+                return False
+            logger.error(f"Error setting digest for document {doc_id}: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error setting digest for document {doc_id}: {e}")
+            raise
+    
     def list_documents(self) -> List[Document]:
         """List all documents."""
         try:
@@ -119,6 +165,27 @@ class SupabaseClient:
             logger.error(f"Error deleting document {doc_id}: {e}")
             raise
     
+    def delete_documents(self, doc_ids: List[UUID]) -> List[str]:
+        """Delete several documents and their vectors in one request.
+        
+        Returns:
+            IDs of the documents that were actually deleted.
+        """
+        if not doc_ids:
+            return []
+        
+        try:
+            result = self.client.table("documents").delete().in_(
+                "id", [str(doc_id) for doc_id in doc_ids]
+            ).execute()
+            deleted_ids = [str(row["id"]) for row in result.data or []]
+            logger.info(f"Deleted {len(deleted_ids)} documents and associated vectors")
+            return deleted_ids
+            
+        except Exception as e:
+            logger.error(f"Error deleting documents {doc_ids}: {e}")
+            raise
+    
     # Vector operations
     def insert_vectors(self, vectors: List[VectorChunk]) -> bool:
         """Insert multiple vector chunks."""
@@ -161,7 +228,7 @@ class SupabaseClient:
                     doc_id=UUID(vector_data["doc_id"]),
                     chunk_id=vector_data["chunk_id"],
                     content=vector_data["content"],
-                    embedding=vector_data["embedding"],
+                    embedding=vector_data.get("embedding"),
                     metadata=vector_data["metadata"]
                 ))
             
@@ -171,10 +238,15 @@ class SupabaseClient:
             logger.error(f"Error performing vector search: {e}")
             raise
     
-    def get_document_vectors(self, doc_id: UUID) -> List[VectorChunk]:
-        """Get all vectors for a specific document."""
+    def get_document_vectors(self, doc_id: UUID, *, include_embedding: bool = False) -> List[VectorChunk]:
+        """Get all vectors for a specific document.
+        
+        Embeddings are large and rarely needed by callers, so they are only
+        downloaded when include_embedding is set.
+        """
+        columns = "*" if include_embedding else "id,doc_id,chunk_id,content,metadata"
         try:
-            result = self.client.table("vectors").select("*").eq("doc_id", str(doc_id)).order("chunk_id").execute()
+            result = self.client.table("vectors").select(columns).eq("doc_id", str(doc_id)).order("chunk_id").execute()
             
             vectors = []
             for vector_data in result.data:
@@ -183,7 +255,7 @@ class SupabaseClient:
                     doc_id=UUID(vector_data["doc_id"]),
                     chunk_id=vector_data["chunk_id"],
                     content=vector_data["content"],
-                    embedding=vector_data["embedding"],
+                    embedding=vector_data.get("embedding"),
                     metadata=vector_data["metadata"]
                 ))
             
@@ -193,6 +265,77 @@ class SupabaseClient:
             logger.error(f"Error getting vectors for document {doc_id}: {e}")
             raise
     
+    def get_document_vectors_preview(self, doc_id: UUID, limit: int = 3) -> List[VectorChunk]:
+        """Get the first chunks of a document without their embeddings."""
+        try:
+            result = self.client.table("vectors").select(
+                "id,doc_id,chunk_id,content"
+            ).eq("doc_id", str(doc_id)).order("chunk_id").limit(limit).execute()
+            
+            return [
+                VectorChunk(
+                    id=UUID(vector_data["id"]),
+                    doc_id=UUID(vector_data["doc_id"]),
+                    chunk_id=vector_data["chunk_id"],
+                    content=vector_data["content"]
+                )
+                for vector_data in result.data
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error getting vector preview for document {doc_id}: {e}")
+            raise
+    
+    def get_all_document_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get chunk statistics for every document in one aggregate query.
+        
+        Returns:
+            Mapping of document ID to chunk_count, total_content_length and
+            has_embeddings. Documents without chunks are not included.
+        """
+        try:
+            result = self.client.rpc("document_stats", {}).execute()
+            
+            return {
+                str(row["doc_id"]): self._parse_document_stats(row)
+                for row in result.data or []
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting document stats: {e}")
+            raise
+    
+    def get_document_stats(self, doc_id: UUID) -> Dict[str, Any]:
+        """Get chunk statistics for one document with a server-side aggregate.
+        
+        Returns:
+            chunk_count, total_content_length and has_embeddings; zero counts
+            if the document has no chunks.
+        """
+        try:
+            result = self.client.rpc("document_stats", {"p_doc_id": str(doc_id)}).execute()
+            
+            if result.data:
+                return self._parse_document_stats(result.data[0])
+            return {
+                "chunk_count": 0,
+                "total_content_length": 0,
+                "has_embeddings": True
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting document stats for {doc_id}: {e}")
+            raise
+    
+    @staticmethod
+    def _parse_document_stats(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a document_stats row into a stats dictionary."""
+        return {
+            "chunk_count": row["chunk_count"],
+            "total_content_length": row["total_content_length"],
+            "has_embeddings": bool(row["has_embeddings"])
+        }
+    
     # Chat history operations
     def store_chat_message(self, message: ChatMessage) -> ChatMessage:
         """Store a chat message."""
@@ -264,13 +407,20 @@ class SupabaseClient:
 
 # Global database client instance
 _db_client: Optional[SupabaseClient] = None
+_db_client_lock = threading.Lock()
 
 
 def get_db_client() -> SupabaseClient:
-    """Get or create global database client instance."""
+    """Get or create global database client instance.
+    
+    Uploads are ingested on worker threads, so creation is guarded by a lock;
+    once the client exists it is returned without locking.
+    """
     global _db_client
     if _db_client is None:
-        _db_client = SupabaseClient()
+        with _db_client_lock:
+            if _db_client is None:
+                _db_client = SupabaseClient()
     return _db_client
 
 
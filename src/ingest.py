@@ -2,6 +2,7 @@
 
 import logging
 import os
+import threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
@@ -27,7 +28,7 @@ class DocumentIngestionPipeline:
         tokenizer_model: str = "sentence-transformers/all-MiniLM-L6-v2",
         embedding_model: str = "text-embedding-3-small",
         max_tokens: int = None,
-        batch_size: int = 10
+        batch_size: int = 64
     ):
         """
         Initialize the ingestion pipeline.
@@ -36,7 +37,7 @@ class DocumentIngestionPipeline:
             tokenizer_model: HuggingFace tokenizer model for chunking
             embedding_model: OpenAI embedding model
             max_tokens: Maximum tokens per chunk (defaults to settings.chunk_size)
-            batch_size: Number of chunks to process in each embedding batch
+            batch_size: Number of chunks sent per embeddings request and vector insert
         """
         self.tokenizer_model = tokenizer_model
         self.embedding_model = embedding_model
@@ -53,12 +54,18 @@ class DocumentIngestionPipeline:
         self.embedder = EmbeddingGenerator(model=embedding_model)
         self.db = get_db_client()
         
+        # The converter and the chunker's fast tokenizer are not thread-safe,
+        # so concurrent ingestions take turns on them and only overlap on
+        # embedding requests and database writes
+        self._docling_lock = threading.Lock()
+        
         logger.info(f"Initialized DocumentIngestionPipeline with {tokenizer_model}, {embedding_model}")
     
     def ingest_document(
         self, 
         file_path: str, 
-        filename: Optional[str] = None
+        filename: Optional[str] = None,
+        content_sha256: Optional[str] = None
     ) -> ConversionResult:
         """
         Complete document ingestion workflow.
@@ -66,9 +73,12 @@ class DocumentIngestionPipeline:
         Args:
             file_path: Path to the document file
             filename: Custom filename (defaults to file_path basename)
+            content_sha256: SHA-256 hex digest of the file content. When given,
+                a document with the same digest is not ingested again.
             
         Returns:
-            ConversionResult with ingestion details
+            ConversionResult with ingestion details; conversion_status is
+            "duplicate" when the content is already in the library
             
         Raises:
             ValueError: If file doesn't exist or is unsupported
@@ -84,15 +94,23 @@ class DocumentIngestionPipeline:
             
             logger.info(f"Starting document ingestion for: {display_filename}")
             
+            # Skip conversion and embedding for content that is already stored
+            if content_sha256:
+                existing = self.db.get_document_by_sha256(content_sha256)
+                if existing:
+                    logger.info(f"Skipping {display_filename}: identical to {existing.filename} ({existing.id})")
+                    return self._duplicate_result(display_filename, existing)
+            
             # Step 1: Convert document using Docling
             logger.info("Step 1: Converting document with Docling")
-            docling_doc = self.converter.convert_document(file_path)
-            
-            if not docling_doc:
-                raise RuntimeError("Document conversion failed - no document returned")
-            
-            if not self.converter.validate_document(docling_doc):
-                raise RuntimeError("Document validation failed after conversion")
+            with self._docling_lock:
+                docling_doc = self.converter.convert_document(file_path)
+                
+                if not docling_doc:
+                    raise RuntimeError("Document conversion failed - no document returned")
+                
+                if not self.converter.validate_document(docling_doc):
+                    raise RuntimeError("Document validation failed after conversion")
             
             # Step 2: Create document record in database
             logger.info("Step 2: Creating document record")
@@ -101,7 +119,8 @@ class DocumentIngestionPipeline:
             try:
                 # Step 3: Chunk document using Docling HybridChunker
                 logger.info("Step 3: Chunking document with HybridChunker")
-                chunks = self.chunker.chunk_document(docling_doc)
+                with self._docling_lock:
+                    chunks = self.chunker.chunk_document(docling_doc)
                 
                 if not chunks:
                     raise RuntimeError("Document chunking produced no chunks")
@@ -112,6 +131,18 @@ class DocumentIngestionPipeline:
                 logger.info("Step 4: Generating embeddings and storing vectors")
                 chunks_created = self._process_and_store_chunks(doc_record.id, chunks)
                 
+                if chunks_created < len(chunks):
+                    raise RuntimeError(f"Stored only {chunks_created}/{len(chunks)} chunks")
+                
+                # Claim the digest only once every chunk is stored, so a failed
+                # ingest can be repaired by uploading the same file again
+                if content_sha256 and not self.db.set_document_sha256(doc_record.id, content_sha256):
+                    # A concurrent upload of the same content finished first
+                    self.db.delete_document(doc_record.id)
+                    existing = self.db.get_document_by_sha256(content_sha256)
+                    logger.info(f"Discarding {display_filename}: identical content was stored meanwhile")
+                    return self._duplicate_result(display_filename, existing or doc_record)
+                
                 # Step 5: Return success result
                 result = ConversionResult(
                     doc_id=doc_record.id,
@@ -145,6 +176,16 @@ class DocumentIngestionPipeline:
                 error_message=str(e)
             )
     
+    def _duplicate_result(self, filename: str, existing: Document) -> ConversionResult:
+        """Build the result for a file whose content is already in the library."""
+        return ConversionResult(
+            doc_id=existing.id,
+            filename=filename,
+            chunks_created=0,
+            conversion_status="duplicate",
+            error_message=f"Identical file already uploaded as {existing.filename}"
+        )
+    
     def _process_and_store_chunks(
         self, 
         doc_id: UUID, 
@@ -159,6 +200,9 @@ class DocumentIngestionPipeline:
             
         Returns:
             Number of chunks successfully stored
+            
+        Raises:
+            RuntimeError: If any batch fails to embed or store
         """
         try:
             total_chunks = len(chunks)
@@ -175,28 +219,28 @@ class DocumentIngestionPipeline:
                 try:
                     # Extract text content from chunks
                     chunk_texts = []
-                    for chunk in batch_chunks:
-                        # Use contextualized text if available, fallback to regular text
-                        try:
-                            text = self.chunker.contextualize_chunk(chunk)
-                            if not text:
+                    chunk_metadatas = []
+                    with self._docling_lock:
+                        for chunk in batch_chunks:
+                            # Use contextualized text if available, fallback to regular text
+                            try:
+                                text = self.chunker.contextualize_chunk(chunk)
+                                if not text:
+                                    text = chunk.text or ""
+                            except Exception:
                                 text = chunk.text or ""
-                        except Exception:
-                            text = chunk.text or ""
-                        
-                        chunk_texts.append(text)
+                            
+                            chunk_texts.append(text)
+                            chunk_metadatas.append(self.chunker.get_chunk_metadata(chunk))
                     
                     # Generate embeddings for batch
                     embeddings = self.embedder.generate_embeddings(chunk_texts)
                     
                     # Create VectorChunk objects
                     vector_chunks = []
-                    for j, (chunk, text, embedding) in enumerate(zip(batch_chunks, chunk_texts, embeddings)):
+                    for j, (chunk_metadata, text, embedding) in enumerate(zip(chunk_metadatas, chunk_texts, embeddings)):
                         chunk_id = i + j
                         
-                        # Extract chunk metadata
-                        chunk_metadata = self.chunker.get_chunk_metadata(chunk)
-                        
                         # Add additional metadata
                         chunk_metadata.update({
                             'batch_id': batch_num,
@@ -223,8 +267,9 @@ class DocumentIngestionPipeline:
                     
                 except Exception as batch_error:
                     logger.error(f"Failed to process batch {batch_num}: {str(batch_error)}")
-                    # Continue with next batch rather than failing completely
-                    continue
+                    # A skipped batch would drop batch_size chunks from a
+                    # document still reported as ingested, so fail instead
+                    raise
             
             logger.info(f"Successfully stored {stored_count}/{total_chunks} chunks")
             return stored_count
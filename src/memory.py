@@ -8,9 +8,13 @@ for coherent multi-turn conversations.
 """
 
 from typing import List, Optional, Dict, Any
+import asyncio
 import logging
-from datetime import datetime, timezone
-import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from postgrest.exceptions import APIError
 
 from .models import ChatMessage
 from .config import get_settings
@@ -18,10 +22,93 @@ from .db import get_db_client
 
 logger = logging.getLogger(__name__)
 
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+_token_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the prompt tokens in a piece of chat text.
+    
+    Uses the cl100k_base encoding when tiktoken is installed and falls back
+    to a rough four-characters-per-token estimate otherwise.
+    
+    Args:
+        text: Text to count tokens for
+        
+    Returns:
+        Number of tokens in the text
+    """
+    global _token_encoding
+    if tiktoken is not None:
+        try:
+            if _token_encoding is None:
+                _token_encoding = tiktoken.get_encoding("cl100k_base")
+            return len(_token_encoding.encode(text))
+        except Exception as e:
+            logger.debug(f"Falling back to estimated token count: {e}")
+    return (len(text) + 3) // 4
+
+
+def fit_token_budget(messages: List[ChatMessage], token_budget: int) -> List[ChatMessage]:
+    """
+    Keep the newest turns whose combined token count fits the budget.
+    
+    Args:
+        messages: Chat turns in chronological order
+        token_budget: Maximum total tokens to keep
+        
+    Returns:
+        Suffix of messages that fits the budget, in chronological order
+    """
+    total_tokens = 0
+    start = len(messages)
+    
+    for message in reversed(messages):
+        # Rows written before token_count existed have no cached count
+        tokens = message.token_count
+        if tokens is None:
+            tokens = count_tokens(message.user_message + message.ai_response)
+        
+        if total_tokens + tokens > token_budget:
+            break
+        total_tokens += tokens
+        start -= 1
+    
+    return messages[start:]
+
+
+def _is_permanent_write_error(error: Exception) -> bool:
+    """
+    Tell whether the database rejected a write in a way a retry cannot fix.
+    
+    Args:
+        error: Exception raised by an insert
+        
+    Returns:
+        True for data and constraint violations (SQLSTATE classes 22 and 23),
+        schema errors (class 42) and PostgREST request errors (PGRST1xx/2xx)
+    """
+    if not isinstance(error, APIError) or not error.code:
+        return False
+    code = str(error.code)
+    return code[:2] in ("22", "23", "42") or code.startswith(("PGRST1", "PGRST2"))
+
 
 class ChatMemoryManager:
     """Manages chat memory storage and retrieval for conversations."""
     
+    # Write-behind buffer limits for stored conversation turns
+    WRITE_BATCH_SIZE = 32
+    WRITE_FLUSH_DELAY_SECONDS = 0.05
+    WRITE_RETRY_MAX_DELAY_SECONDS = 30.0
+    MAX_PENDING_TURNS = 256
+    MAX_TRACKED_SESSIONS = 1024
+    
     def __init__(self, memory_limit: int = 5):
         """
         Initialize the chat memory manager.
@@ -32,11 +119,20 @@ class ChatMemoryManager:
         self.config = get_settings()
         self.supabase_client = get_db_client()
         self.memory_limit = memory_limit
+        
+        # Turns accepted by store_chat_turn but not yet written to the database
+        self._pending_turns: List[Dict[str, Any]] = []
+        self._next_turn_indexes: "OrderedDict[str, int]" = OrderedDict()
+        self._buffer_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._retry_delay = self.WRITE_FLUSH_DELAY_SECONDS
     
     async def get_chat_memory(
         self, 
         session_id: str, 
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        after: Optional[datetime] = None
     ) -> List[ChatMessage]:
         """
         Retrieve chat history for a session with rolling window.
@@ -44,6 +140,10 @@ class ChatMemoryManager:
         Args:
             session_id: Unique session identifier
             limit: Maximum number of turns to retrieve (defaults to memory_limit)
+            token_budget: Maximum total tokens of the returned turns; the newest
+                turns that fit are kept (defaults to no budget)
+            after: Only return turns stored after this time, for callers that
+                already hold the earlier history (defaults to all turns)
             
         Returns:
             List of ChatMessage objects in chronological order
@@ -57,17 +157,25 @@ class ChatMemoryManager:
         logger.info(f"Retrieving chat memory for session {session_id[:8]}... (limit: {limit})")
         
         try:
-            response = self.supabase_client.client.table("chat_histories").select("*").eq(
+            query = self.supabase_client.client.table("chat_histories").select("*").eq(
                 "session_id", session_id
-            ).order("turn_index", desc=True).limit(limit).execute()
+            )
+            if after is not None:
+                query = query.gt("created_at", after.isoformat())
+            response = await asyncio.to_thread(
+                query.order("turn_index", desc=True).limit(limit).execute
+            )
+            
+            # Turns still waiting in the write buffer are not in the database yet
+            pending = self._get_pending_turns(session_id)
             
-            if not response.data:
+            if not response.data and not pending:
                 logger.info(f"No chat history found for session {session_id[:8]}...")
                 return []
             
             # Convert to ChatMessage objects
             messages = []
-            for record in reversed(response.data):  # Reverse to get chronological order
+            for record in reversed(response.data or []):  # Reverse to get chronological order
                 try:
                     message = ChatMessage(
                         id=record['id'],
@@ -75,6 +183,7 @@ class ChatMemoryManager:
                         turn_index=record['turn_index'],
                         user_message=record['user_message'],
                         ai_response=record['ai_response'],
+                        token_count=record.get('token_count'),
                         created_at=record['created_at']
                     )
                     messages.append(message)
@@ -82,6 +191,19 @@ class ChatMemoryManager:
                     logger.warning(f"Failed to parse chat message: {e}")
                     continue
             
+            for record in pending:
+                messages.append(ChatMessage(
+                    session_id=record['session_id'],
+                    turn_index=record['turn_index'],
+                    user_message=record['user_message'],
+                    ai_response=record['ai_response'],
+                    token_count=record['token_count']
+                ))
+            messages = messages[-limit:]
+            
+            if token_budget is not None:
+                messages = fit_token_budget(messages, token_budget)
+            
             logger.info(f"Retrieved {len(messages)} chat turns for session {session_id[:8]}...")
             return messages
             
@@ -99,6 +221,10 @@ class ChatMemoryManager:
         """
         Store a complete conversation turn (user message + AI response).
         
+        The turn is buffered and written in the background together with any
+        other pending turns, so callers don't wait on the insert round-trip.
+        Use flush() to force pending turns to the database.
+        
         Args:
             session_id: Unique session identifier
             user_message: User's input message
@@ -114,30 +240,167 @@ class ChatMemoryManager:
             # Get the next turn index
             turn_index = await self._get_next_turn_index(session_id)
             
-            # Create the conversation turn record
+            # Create the conversation turn record (the database assigns id and created_at)
             turn_record = {
-                'id': str(uuid.uuid4()),
                 'session_id': session_id,
                 'turn_index': turn_index,
                 'user_message': user_message,
                 'ai_response': ai_response,
-                'created_at': datetime.now(timezone.utc).isoformat()
+                'token_count': count_tokens(user_message + ai_response)
             }
             
-            # Insert the conversation turn
-            response = self.supabase_client.client.table("chat_histories").insert(turn_record).execute()
+            with self._buffer_lock:
+                self._pending_turns.append(turn_record)
+                self._remember_next_turn_index(session_id, turn_index + 1)
+                buffer_full = len(self._pending_turns) >= self.WRITE_BATCH_SIZE
             
-            if not response.data:
-                raise Exception("Failed to store conversation turn")
+            if buffer_full:
+                await self.flush()
+            else:
+                self._schedule_flush()
             
-            logger.info(f"Successfully stored conversation turn {turn_index} for session {session_id[:8]}...")
+        except Exception as e:
+            logger.error(f"Failed to store conversation turn: {e}")
+            raise
+    
+    async def flush(self) -> None:
+        """
+        Write all buffered conversation turns to the database.
+        
+        Batches the database rejects outright, such as a turn index that
+        already exists, are logged and dropped since retrying cannot succeed.
+        On any other error the unsent turns stay buffered and a retry is
+        scheduled with exponential backoff.
+        
+        Raises:
+            Exception: If a batched insert fails with a retryable error
+        """
+        with self._buffer_lock:
+            records = self._pending_turns
+            self._pending_turns = []
+        
+        if not records:
+            return
+        
+        stored: List[Dict[str, Any]] = []
+        sent = 0
+        try:
+            for start in range(0, len(records), self.WRITE_BATCH_SIZE):
+                batch = records[start:start + self.WRITE_BATCH_SIZE]
+                
+                try:
+                    # Insert the conversation turns with a single multi-row insert
+                    response = await asyncio.to_thread(
+                        self.supabase_client.client.table("chat_histories").insert(batch).execute
+                    )
+                    
+                    if not response.data:
+                        raise Exception("Failed to store conversation turn")
+                    stored.extend(batch)
+                    
+                except Exception as e:
+                    if not _is_permanent_write_error(e):
+                        raise
+                    logger.error(f"Dropping {len(batch)} conversation turns rejected by the database: {e}")
+                    # The cached indexes may be stale, so re-read them from the database
+                    with self._buffer_lock:
+                        for record in batch:
+                            self._next_turn_indexes.pop(record['session_id'], None)
+                
+                sent += len(batch)
             
-            # Clean up old turns if we exceed the memory limit
-            await self._cleanup_old_messages(session_id)
+            self._retry_delay = self.WRITE_FLUSH_DELAY_SECONDS
+            logger.info(f"Successfully stored {len(stored)} conversation turns")
             
         except Exception as e:
-            logger.error(f"Failed to store conversation turn: {e}")
+            # Put unsent turns back ahead of any turns buffered meanwhile so the
+            # next flush retries them in order; cached turn indexes stay valid
+            with self._buffer_lock:
+                self._pending_turns = records[sent:] + self._pending_turns
+                overflow = len(self._pending_turns) - self.MAX_PENDING_TURNS
+                if overflow > 0:
+                    del self._pending_turns[:overflow]
+            if overflow > 0:
+                logger.warning(f"Dropped {overflow} oldest buffered conversation turns")
+            
+            self._retry_delay = min(self._retry_delay * 2, self.WRITE_RETRY_MAX_DELAY_SECONDS)
+            self._schedule_flush(self._retry_delay)
+            logger.error(f"Failed to flush conversation turns, retrying in {self._retry_delay:.2f}s: {e}")
             raise
+        
+        # Clean up old turns if we exceed the memory limit
+        latest_turn_indexes: Dict[str, int] = {}
+        for record in stored:
+            session_id = record['session_id']
+            latest_turn_indexes[session_id] = max(
+                record['turn_index'], latest_turn_indexes.get(session_id, 0)
+            )
+        for session_id, latest_turn_index in latest_turn_indexes.items():
+            await self._cleanup_old_messages(session_id, latest_turn_index)
+    
+    def _schedule_flush(self, delay: Optional[float] = None) -> None:
+        """
+        Schedule a background flush of buffered turns on the running event loop.
+        
+        Args:
+            delay: Seconds to wait first (defaults to WRITE_FLUSH_DELAY_SECONDS)
+        """
+        loop = asyncio.get_running_loop()
+        task = self._flush_task
+        
+        # A task left pending on a closed loop never completes, so replace it;
+        # a flush task scheduling its own retry replaces itself as well
+        if (
+            task is not None and not task.done() and task.get_loop() is loop
+            and task is not asyncio.current_task()
+        ):
+            return
+        
+        if delay is None:
+            delay = self.WRITE_FLUSH_DELAY_SECONDS
+        self._flush_task = loop.create_task(self._flush_after_delay(delay))
+    
+    async def _flush_after_delay(self, delay: float) -> None:
+        """Flush buffered turns after a delay to coalesce writes or back off retries."""
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Background flush of conversation turns failed: {e}")
+    
+    def _remember_next_turn_index(self, session_id: str, next_index: int) -> None:
+        """
+        Cache a session's next turn index, evicting the least recently used session.
+        
+        Must be called with _buffer_lock held. Sessions with buffered turns are
+        never evicted, since the database does not know those turns yet.
+        
+        Args:
+            session_id: Session the index belongs to
+            next_index: Turn index the session's next turn will use
+        """
+        self._next_turn_indexes[session_id] = next_index
+        self._next_turn_indexes.move_to_end(session_id)
+        
+        if len(self._next_turn_indexes) > self.MAX_TRACKED_SESSIONS:
+            pending_sessions = {record['session_id'] for record in self._pending_turns}
+            for tracked_session in self._next_turn_indexes:
+                if tracked_session not in pending_sessions:
+                    del self._next_turn_indexes[tracked_session]
+                    break
+    
+    def _get_pending_turns(self, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Get buffered turns for a session that are not yet in the database.
+        
+        Args:
+            session_id: Session to get pending turns for
+            
+        Returns:
+            Pending turn records in turn order
+        """
+        with self._buffer_lock:
+            return [record for record in self._pending_turns if record['session_id'] == session_id]
     
     async def _get_next_turn_index(self, session_id: str) -> int:
         """
@@ -148,20 +411,27 @@ class ChatMemoryManager:
             
         Returns:
             Next turn index (0-based)
+            
+        Raises:
+            Exception: If the turn index lookup fails
         """
+        # Buffered turns may not be in the database yet, so trust the local counter
+        with self._buffer_lock:
+            if session_id in self._next_turn_indexes:
+                return self._next_turn_indexes[session_id]
+        
         try:
-            response = self.supabase_client.client.table("chat_histories").select("turn_index").eq(
-                "session_id", session_id
-            ).order("turn_index", desc=True).limit(1).execute()
+            # Falling back to 0 here would overwrite turn ordering, so errors propagate
+            response = await asyncio.to_thread(self.supabase_client.client.rpc(
+                "next_turn_index",
+                {"p_session_id": session_id}
+            ).execute)
             
-            if response.data:
-                return response.data[0]['turn_index'] + 1
-            else:
-                return 0  # First turn
+            return int(response.data or 0)
                 
         except Exception as e:
-            logger.warning(f"Failed to get next turn index, using 0: {e}")
-            return 0
+            logger.error(f"Failed to get next turn index: {e}")
+            raise
     
     async def clear_session_memory(self, session_id: str) -> None:
         """
@@ -175,10 +445,16 @@ class ChatMemoryManager:
         """
         logger.info(f"Clearing chat memory for session {session_id[:8]}...")
         
+        with self._buffer_lock:
+            self._pending_turns = [
+                record for record in self._pending_turns if record['session_id'] != session_id
+            ]
+            self._next_turn_indexes.pop(session_id, None)
+        
         try:
-            response = self.supabase_client.client.table("chat_histories").delete().eq(
+            response = await asyncio.to_thread(self.supabase_client.client.table("chat_histories").delete().eq(
                 "session_id", session_id
-            ).execute()
+            ).execute)
             
             logger.info(f"Cleared chat memory for session {session_id[:8]}...")
             
@@ -186,32 +462,25 @@ class ChatMemoryManager:
             logger.error(f"Failed to clear session memory: {e}")
             raise
     
-    async def _cleanup_old_messages(self, session_id: str) -> None:
+    async def _cleanup_old_messages(self, session_id: str, latest_turn_index: int) -> None:
         """
         Clean up old conversation turns beyond the memory limit.
         
         Args:
             session_id: Session to clean up
+            latest_turn_index: Turn index of the most recently stored turn
         """
+        # Turns are numbered consecutively, so everything below this index is stale
+        cutoff = latest_turn_index - self.memory_limit + 1
+        if cutoff <= 0:
+            return  # No cleanup needed
+        
         try:
-            # Get all turns for the session
-            response = self.supabase_client.client.table("chat_histories").select("id, turn_index").eq(
+            await asyncio.to_thread(self.supabase_client.client.table("chat_histories").delete().eq(
                 "session_id", session_id
-            ).order("turn_index", desc=True).execute()
-            
-            if not response.data or len(response.data) <= self.memory_limit:
-                return  # No cleanup needed
+            ).lt("turn_index", cutoff).execute)
             
-            # Keep only the most recent turns
-            old_turns = response.data[self.memory_limit:]
-            
-            if old_turns:
-                old_ids = [turn['id'] for turn in old_turns]
-                self.supabase_client.client.table("chat_histories").delete().in_(
-                    "id", old_ids
-                ).execute()
-                
-                logger.info(f"Cleaned up {len(old_ids)} old turns for session {session_id[:8]}...")
+            logger.info(f"Cleaned up turns before {cutoff} for session {session_id[:8]}...")
                 
         except Exception as e:
             logger.warning(f"Failed to cleanup old turns: {e}")
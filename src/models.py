@@ -40,6 +40,7 @@ class ChatMessage(BaseModel):
     turn_index: int
     user_message: str
     ai_response: str
+    token_count: Optional[int] = None
     created_at: Optional[datetime] = None
 
 
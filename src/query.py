@@ -7,9 +7,11 @@ the most relevant document chunks from the vector database.
 
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Any
 import logging
 import asyncio
+from collections import OrderedDict
+from uuid import UUID
 from openai import OpenAI
 
 from .models import VectorChunk
@@ -22,12 +24,15 @@ logger = logging.getLogger(__name__)
 class QueryProcessor:
     """Handles query embedding and vector search operations."""
     
+    # Maximum number of query embeddings kept in memory (~6 KB each)
+    EMBEDDING_CACHE_SIZE = 1024
+    
     def __init__(self):
         """Initialize the query processor with OpenAI and Supabase clients."""
         self.config = get_settings()
         self.openai_client = OpenAI(api_key=self.config.openai_api_key)
         self.supabase_client = get_db_client()
-        self._embedding_cache: Dict[str, List[float]] = {}
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
     
     async def embed_query(self, query: str) -> List[float]:
         """
@@ -47,11 +52,14 @@ class QueryProcessor:
         # Check cache first
         if query in self._embedding_cache:
             logger.debug("Using cached embedding for query")
+            self._embedding_cache.move_to_end(query)
             return self._embedding_cache[query]
         
         try:
-            # Generate embedding using OpenAI
-            response = self.openai_client.embeddings.create(
+            # Generate embedding using OpenAI off the event loop so concurrent
+            # work (e.g. the chat memory lookup) can proceed meanwhile
+            response = await asyncio.to_thread(
+                self.openai_client.embeddings.create,
                 model="text-embedding-3-small",
                 input=query,
                 dimensions=1536
@@ -59,8 +67,10 @@ class QueryProcessor:
             
             embedding = response.data[0].embedding
             
-            # Cache the result
+            # Cache the result, evicting the least recently used query
             self._embedding_cache[query] = embedding
+            if len(self._embedding_cache) > self.EMBEDDING_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
             
             logger.info(f"Generated embedding with {len(embedding)} dimensions")
             return embedding
@@ -92,14 +102,15 @@ class QueryProcessor:
         logger.info(f"Performing vector search with top_k={top_k}, threshold={similarity_threshold}")
         
         try:
-            # Use the RPC function for vector similarity search
-            response = self.supabase_client.client.rpc(
+            # Use the RPC function for vector similarity search, off the event
+            # loop so other sessions' chat work is not blocked behind it
+            response = await asyncio.to_thread(self.supabase_client.client.rpc(
                 "vector_search",
                 {
                     "query_embedding": query_embedding,
                     "match_count": top_k
                 }
-            ).execute()
+            ).execute)
             
             if not response.data:
                 logger.warning("No similar vectors found")
@@ -116,17 +127,21 @@ class QueryProcessor:
                     if similarity < similarity_threshold:
                         continue
                     
-                    chunk = VectorChunk(
-                        id=result['id'],
-                        doc_id=result['doc_id'],
+                    # Add similarity score to metadata for reference
+                    metadata = dict(result.get('metadata') or {})
+                    metadata['similarity_score'] = similarity
+                    
+                    # Rows come straight from our own RPC, so skip pydantic
+                    # validation and only coerce the UUID fields. The RPC no
+                    # longer returns match embeddings; nothing downstream needs them.
+                    chunk = VectorChunk.model_construct(
+                        id=UUID(str(result['id'])),
+                        doc_id=UUID(str(result['doc_id'])),
                         chunk_id=result['chunk_id'],
                         content=result['content'],
-                        metadata=result.get('metadata', {}),
-                        embedding=result['embedding']
+                        metadata=metadata,
+                        embedding=result.get('embedding')
                     )
-                    
-                    # Add similarity score to metadata for reference
-                    chunk.metadata['similarity_score'] = similarity
                     chunks.append(chunk)
                     
                 except Exception as e:
@@ -7,16 +7,20 @@ signup, and session management using Supabase authentication services.
 
 import streamlit as st
 import logging
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
 from supabase import Client
 from supabase.lib.client_options import ClientOptions
 from supabase import create_client
-import uuid
+import secrets
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Shared pool for Supabase auth round-trips so concurrent sessions overlap them
+_auth_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="supabase-auth")
+
 
 class AuthManager:
     """Manages user authentication with Supabase."""
@@ -34,6 +38,23 @@ class AuthManager:
             options=options
         )
     
+    def _run_auth_call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking Supabase auth call on the shared auth executor.
+        
+        Args:
+            func: Supabase auth method to invoke
+            *args: Positional arguments for the auth method
+            
+        Returns:
+            The auth method's return value
+            
+        Raises:
+            concurrent.futures.TimeoutError: If the call exceeds the Supabase timeout
+        """
+        future = _auth_executor.submit(func, *args)
+        return future.result(timeout=settings.supabase_timeout_seconds)
+    
     def sign_up(self, email: str, password: str) -> tuple[bool, str]:
         """
         Sign up a new user.
@@ -46,7 +67,7 @@ class AuthManager:
             Tuple of (success: bool, message: str)
         """
         try:
-            response = self.client.auth.sign_up({
+            response = self._run_auth_call(self.client.auth.sign_up, {
                 "email": email,
                 "password": password
             })
@@ -74,7 +95,7 @@ class AuthManager:
             Tuple of (success: bool, message: str, user_data: Optional[Dict])
         """
         try:
-            response = self.client.auth.sign_in_with_password({
+            response = self._run_auth_call(self.client.auth.sign_in_with_password, {
                 "email": email,
                 "password": password
             })
@@ -102,7 +123,7 @@ class AuthManager:
             Tuple of (success: bool, message: str)
         """
         try:
-            self.client.auth.sign_out()
+            self._run_auth_call(self.client.auth.sign_out)
             logger.info("User signed out successfully")
             return True, "Signed out successfully!"
             
@@ -121,7 +142,7 @@ class AuthManager:
             Tuple of (success: bool, message: str)
         """
         try:
-            self.client.auth.reset_password_email(email)
+            self._run_auth_call(self.client.auth.reset_password_email, email)
             logger.info(f"Password reset email sent to: {email}")
             return True, "Password reset email sent! Check your inbox."
             
@@ -176,7 +197,7 @@ def render_sign_in_form(auth_manager: AuthManager):
     with st.form("sign_in_form"):
         email = st.text_input("Email", placeholder="your.email@example.com")
         password = st.text_input("Password", type="password", placeholder="Enter your password")
-        submit_button = st.form_submit_button("Sign In", use_container_width=True)
+        submit_button = st.form_submit_button("Sign In", width="stretch")
         
         if submit_button:
             if not email or not password:
@@ -193,7 +214,7 @@ def render_sign_in_form(auth_manager: AuthManager):
                 st.session_state.authenticated = True
                 st.session_state.user_id = user_data["user_id"]
                 st.session_state.user_email = user_data["email"]
-                st.session_state.session_id = str(uuid.uuid4())
+                st.session_state.session_id = secrets.token_hex(16)
                 
                 # Rerun to show main app
                 st.rerun()
@@ -209,7 +230,7 @@ def render_sign_up_form(auth_manager: AuthManager):
         email = st.text_input("Email", placeholder="your.email@example.com")
         password = st.text_input("Password", type="password", placeholder="Choose a strong password")
         confirm_password = st.text_input("Confirm Password", type="password", placeholder="Confirm your password")
-        submit_button = st.form_submit_button("Create Account", use_container_width=True)
+        submit_button = st.form_submit_button("Create Account", width="stretch")
         
         if submit_button:
             if not email or not password or not confirm_password:
@@ -240,7 +261,7 @@ def render_reset_password_form(auth_manager: AuthManager):
     
     with st.form("reset_password_form"):
         email = st.text_input("Email", placeholder="your.email@example.com")
-        submit_button = st.form_submit_button("Send Reset Email", use_container_width=True)
+        submit_button = st.form_submit_button("Send Reset Email", width="stretch")
         
         if submit_button:
             if not email:
@@ -264,8 +285,7 @@ def logout_user():
     auth_manager.sign_out()
     
     # Clear session state
-    for key in list(st.session_state.keys()):
-        del st.session_state[key]
+    st.session_state.clear()
     
     # Rerun to show auth flow
     st.rerun()
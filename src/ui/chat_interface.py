@@ -6,29 +6,125 @@ real-time typing indicators, and session management.
 """
 
 import streamlit as st
+import hashlib
+import json
 import logging
+import secrets
 import uuid
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import asyncio
+import threading
 import time
+from collections import OrderedDict
 
-from ..chat import ChatOrchestrator
-from ..memory import ChatMemoryManager
 from ..models import ChatMessage, VectorChunk
-from ..config import settings
+from .document_manager import get_corpus_version
 
 logger = logging.getLogger(__name__)
 
+try:
+    import uvloop
+    _new_event_loop = uvloop.new_event_loop
+except ImportError:  # pragma: no cover - optional dependency
+    _new_event_loop = asyncio.new_event_loop
+
+# Imported on first use by _lazy_imports; it pulls in the OpenAI and
+# Supabase SDKs, which the chat page doesn't need until a manager is built
+ChatOrchestrator = None
+
+
+def _lazy_imports():
+    """Import the chat orchestration classes on first use."""
+    global ChatOrchestrator
+    if ChatOrchestrator is None:
+        from ..chat import ChatOrchestrator
+
+
+# Event loop shared by all sessions, running forever on a daemon thread.
+# Blocking Supabase calls made by the chat coroutines run in worker threads
+# via asyncio.to_thread, so one session's database work does not hold up others
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Get the background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = _new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="chat-event-loop", daemon=True
+            ).start()
+    return _loop
+
+
+def _run(coro):
+    """
+    Run a coroutine on the background event loop and wait for its result.
+    
+    Args:
+        coro: Coroutine to run
+        
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+# Citation patterns, compiled once and shared by every rendered message
+_CITATION_RE = re.compile(r'\[([^\]]+)\]')
+_CLEAN_RE = re.compile(r'\[\d+\]|\[Doc:[^\]]+\]')
+_WS_RE = re.compile(r'\s+')
+
+# Suggested starter questions; the leading blank entry means nothing is picked
+_SUGGESTION_OPTIONS = (
+    "",
+    "What are the main topics covered in my documents?",
+    "Summarize the key findings from the uploaded documents",
+    "Find information about specific topics or keywords",
+    "Compare different documents in my collection",
+    "What insights can you provide from my document library?"
+)
+
 
 class ChatInterfaceManager:
     """Manages chat interface operations and state."""
     
     def __init__(self):
-        """Initialize the chat interface manager."""
+        """
+        Initialize the chat interface manager.
+        
+        UI code should use get_chat_manager() rather than constructing
+        managers directly, so every session shares one set of clients.
+        """
+        self._initialized = False
+        self._initialize()
+    
+    def _initialize(self):
+        """Build the orchestrator and memory manager once."""
+        if self._initialized:
+            return
+        
+        _lazy_imports()
         self.chat_orchestrator = ChatOrchestrator()
-        self.memory_manager = ChatMemoryManager()
+        # Share the orchestrator's memory manager so pending turns in its
+        # write buffer are visible to history reads
+        self.memory_manager = self.chat_orchestrator.memory_manager
+        self._initialized = True
+    
+    def run_async(self, coro):
+        """
+        Run a coroutine to completion on the shared background event loop.
+        
+        Args:
+            coro: Coroutine to run
+            
+        Returns:
+            The coroutine's result
+        """
+        return _run(coro)
     
     def ensure_session_id(self) -> str:
         """
@@ -38,32 +134,32 @@ class ChatInterfaceManager:
             Current or new session ID
         """
         if "session_id" not in st.session_state or st.session_state.session_id is None:
-            st.session_state.session_id = str(uuid.uuid4())
+            st.session_state.session_id = secrets.token_hex(16)
             logger.info(f"Created new chat session: {st.session_state.session_id}")
         
         return st.session_state.session_id
     
-    def get_chat_history(self, session_id: str, limit: int = 10) -> List[ChatMessage]:
+    def get_chat_history(
+        self,
+        session_id: str,
+        limit: int = 10,
+        after: Optional[datetime] = None
+    ) -> List[ChatMessage]:
         """
         Get chat history for the current session.
         
         Args:
             session_id: Session ID
             limit: Maximum number of messages to retrieve
+            after: Only retrieve turns stored after this time (defaults to all)
             
         Returns:
             List of ChatMessage objects
         """
         try:
-            # Use asyncio to run the async function
-            import asyncio
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(
-                self.memory_manager.get_chat_memory(session_id, limit)
+            return self.run_async(
+                self.memory_manager.get_chat_memory(session_id, limit, after=after)
             )
-            loop.close()
-            return result
         except Exception as e:
             logger.error(f"Error retrieving chat history: {e}")
             return []
@@ -94,7 +190,7 @@ class ChatInterfaceManager:
                 "session_id": session_id
             }
     
-    def store_chat_turn(self, session_id: str, user_message: str, ai_response: str) -> bool:
+    async def store_chat_turn(self, session_id: str, user_message: str, ai_response: str) -> bool:
         """
         Store a chat turn in memory.
         
@@ -107,7 +203,7 @@ class ChatInterfaceManager:
             True if successful, False otherwise
         """
         try:
-            self.memory_manager.store_chat_turn(session_id, user_message, ai_response)
+            await self.memory_manager.store_chat_turn(session_id, user_message, ai_response)
             return True
         except Exception as e:
             logger.error(f"Error storing chat turn: {e}")
@@ -120,7 +216,7 @@ class ChatInterfaceManager:
         Returns:
             New session ID
         """
-        new_session_id = str(uuid.uuid4())
+        new_session_id = secrets.token_hex(16)
         st.session_state.session_id = new_session_id
         
         # Clear chat history from session state
@@ -128,11 +224,47 @@ class ChatInterfaceManager:
             del st.session_state.chat_history
         if "messages" in st.session_state:
             del st.session_state.messages
+        _reset_chat_stats()
         
         logger.info(f"Started new chat session: {new_session_id}")
         return new_session_id
 
 
+@st.cache_resource
+def get_chat_manager() -> ChatInterfaceManager:
+    """Get the process-wide ChatInterfaceManager, shared across reruns and sessions."""
+    return ChatInterfaceManager()
+
+
+def _append_message(message: Dict[str, Any]):
+    """
+    Append a message to the session and update the running chat statistics.
+    
+    Args:
+        message: Message dictionary with role and content
+    """
+    # Format timestamps once instead of on every rerun
+    timestamp = message.get("timestamp")
+    if isinstance(timestamp, datetime):
+        message["_ts_str"] = timestamp.strftime('%H:%M:%S')
+        if not st.session_state.messages:
+            st.session_state._started_str = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    
+    st.session_state.messages.append(message)
+    
+    if message["role"] == "user":
+        st.session_state._user_count = st.session_state.get("_user_count", 0) + 1
+    else:
+        st.session_state._ai_count = st.session_state.get("_ai_count", 0) + 1
+    st.session_state._total_chars = st.session_state.get("_total_chars", 0) + len(message["content"])
+
+
+def _reset_chat_stats():
+    """Reset the running chat statistics when the message list is cleared."""
+    st.session_state._user_count = 0
+    st.session_state._ai_count = 0
+    st.session_state._total_chars = 0
+    st.session_state._started_str = None
 
 
 def render_chat_header(session_id: str, chat_manager: ChatInterfaceManager):
@@ -142,7 +274,7 @@ def render_chat_header(session_id: str, chat_manager: ChatInterfaceManager):
     
     with col1:
         st.markdown(f"**Session ID:** `{session_id[:8]}...`")
-        message_count = len(st.session_state.get("messages", [])) // 2
+        message_count = st.session_state.get("_ai_count", 0)
         st.caption(f"💬 {message_count} messages in this conversation")
     
     with col2:
@@ -154,6 +286,7 @@ def render_chat_header(session_id: str, chat_manager: ChatInterfaceManager):
     with col3:
         if st.button("🗑️ Clear Chat", width="stretch"):
             st.session_state.messages = []
+            _reset_chat_stats()
             st.rerun()
     
     st.markdown("---")
@@ -194,46 +327,54 @@ def render_message(message: Dict[str, Any], index: int):
     """
     is_user = message["role"] == "user"
     
-    # Message container with styling
-    if is_user:
-        st.markdown(
-            f'<div class="chat-message user-message">'
-            f'<strong>You:</strong><br>{message["content"]}'
-            f'</div>',
-            unsafe_allow_html=True
-        )
-    else:
-        # AI message with potential citations
-        st.markdown(
-            f'<div class="chat-message ai-message">'
-            f'<strong>🤖 AI Assistant:</strong><br>'
-            f'</div>',
-            unsafe_allow_html=True
-        )
+    with st.chat_message("user" if is_user else "assistant"):
+        if is_user:
+            st.markdown(message["content"])
+        else:
+            # Parse and display response with citations
+            render_ai_response(message["content"], index, message.get("id"))
         
-        # Parse and display response with citations
-        render_ai_response(message["content"], index)
+        # Timestamp if available
+        if "_ts_str" in message:
+            st.caption(f"⏰ {message['_ts_str']}")
+        elif isinstance(message.get("timestamp"), datetime):
+            st.caption(f"⏰ {message['timestamp'].strftime('%H:%M:%S')}")
+
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def _parse_ai_content(msg_id: str, _content: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Parse an AI message once; later reruns reuse the result by message ID.
     
-    # Timestamp if available
-    if "timestamp" in message:
-        timestamp = message["timestamp"]
-        if isinstance(timestamp, datetime):
-            st.caption(f"⏰ {timestamp.strftime('%H:%M:%S')}")
+    Args:
+        msg_id: Stable message ID (the cache key)
+        _content: AI response content (excluded from the cache key)
+        
+    Returns:
+        Tuple of (clean_content, citations)
+    """
+    return remove_citation_markers(_content), parse_citations(_content)
 
 
-def render_ai_response(content: str, index: int):
+def render_ai_response(content: str, index: int, msg_id: Optional[str] = None):
     """
     Render AI response with citation parsing and display.
     
     Args:
         content: AI response content
         index: Message index for unique keys
+        msg_id: Stable message ID used to cache the parsed content
     """
-    # Parse citations from the response
-    citations = parse_citations(content)
+    if msg_id:
+        clean_content, citations = _parse_ai_content(msg_id, content)
+    else:
+        # Parse citations from the response
+        citations = parse_citations(content)
+        
+        # Main response content (without citation markers)
+        clean_content = remove_citation_markers(content)
     
-    # Display main response content (without citation markers)
-    clean_content = remove_citation_markers(content)
+    # Display main response content
     st.markdown(clean_content)
     
     # Display citations if any
@@ -259,9 +400,12 @@ def parse_citations(content: str) -> List[Dict[str, Any]]:
     """
     citations = []
     
+    # Most responses carry no citations at all
+    if '[' not in content:
+        return citations
+    
     # Look for citation patterns like [1], [Doc: filename], etc.
-    citation_pattern = r'\[([^\]]+)\]'
-    matches = re.findall(citation_pattern, content)
+    matches = _CITATION_RE.findall(content)
     
     for match in matches:
         # Try to parse different citation formats
@@ -303,11 +447,12 @@ def remove_citation_markers(content: str) -> str:
     """
     # Remove citation markers but keep the content readable
     # This is a simple implementation - could be enhanced based on citation format
-    cleaned = re.sub(r'\[\d+\]', '', content)
-    cleaned = re.sub(r'\[Doc:[^\]]+\]', '', cleaned)
+    # Numbered and document markers are stripped in a single pass, skipped
+    # entirely when the content has no brackets
+    cleaned = _CLEAN_RE.sub('', content) if '[' in content else content
     
     # Clean up extra spaces
-    cleaned = re.sub(r'\s+', ' ', cleaned).strip()
+    cleaned = _WS_RE.sub(' ', cleaned).strip()
     
     return cleaned
 
@@ -356,6 +501,100 @@ def render_chat_input(chat_manager: ChatInterfaceManager, session_id: str):
             handle_user_input(user_input.strip(), chat_manager, session_id)
 
 
+def _conversation_state_key(chat_history: List[ChatMessage], corpus_version: int) -> str:
+    """
+    Hash what the model sees besides the query so identical states share a key.
+    
+    Args:
+        chat_history: Turns passed to the orchestrator with the query
+        corpus_version: Document library version from get_corpus_version
+        
+    Returns:
+        Hex digest identifying the conversation state
+    """
+    state = json.dumps(
+        [corpus_version, [(turn.user_message, turn.ai_response) for turn in chat_history]],
+        separators=(",", ":")
+    )
+    return hashlib.blake2b(state.encode()).hexdigest()
+
+
+# Final responses keyed by (conversation state, query), shared across sessions.
+# Kept out of st.cache_data because the response is streamed into a
+# placeholder the cached function would not own, which Streamlit cannot replay
+_RESPONSE_CACHE_SIZE = 512
+_RESPONSE_CACHE_TTL_SECONDS = 3600
+_response_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+
+def _get_cached_response(state_key: str, query: str) -> Optional[Dict[str, Any]]:
+    """Return the cached response for a repeated conversation state, if still fresh."""
+    with _response_cache_lock:
+        entry = _response_cache.get((state_key, query))
+        if entry is None:
+            return None
+        cached_at, response = entry
+        if time.monotonic() - cached_at > _RESPONSE_CACHE_TTL_SECONDS:
+            del _response_cache[(state_key, query)]
+            return None
+        _response_cache.move_to_end((state_key, query))
+        return response
+
+
+def _cache_response(state_key: str, query: str, response: Dict[str, Any]):
+    """Store a completed response, evicting the least recently used entry."""
+    with _response_cache_lock:
+        _response_cache[(state_key, query)] = (time.monotonic(), response)
+        _response_cache.move_to_end((state_key, query))
+        while len(_response_cache) > _RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def _stream_response(
+    query: str,
+    session_id: str,
+    chat_manager: ChatInterfaceManager,
+    chat_history: List[ChatMessage],
+    placeholder: Any
+) -> Dict[str, Any]:
+    """
+    Answer a query, streaming the response into the placeholder as it arrives.
+    
+    Args:
+        query: User's question
+        session_id: Chat session ID
+        chat_manager: ChatInterfaceManager instance
+        chat_history: Recent turns held in session state, passed to the
+            orchestrator so it does not re-read chat memory
+        placeholder: Streamlit placeholder that displays the partial response
+        
+    Returns:
+        Dictionary with AI response and sources
+    """
+    sources: List[VectorChunk] = []
+    
+    stream = chat_manager.chat_orchestrator.process_query_stream(
+        query, session_id, sources=sources, chat_history=chat_history
+    )
+    
+    async def _next_delta() -> Optional[str]:
+        # anext() is only a builtin from Python 3.10
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+    
+    # Pull deltas one at a time so the placeholder is updated from the
+    # script thread, which owns the Streamlit context
+    parts = []
+    while (delta := chat_manager.run_async(_next_delta())) is not None:
+        parts.append(delta)
+        placeholder.markdown("".join(parts))
+    
+    return {"response": "".join(parts), "sources": sources}
+
+
 def handle_user_input(user_input: str, chat_manager: ChatInterfaceManager, session_id: str):
     """
     Handle user input and generate AI response.
@@ -366,47 +605,69 @@ def handle_user_input(user_input: str, chat_manager: ChatInterfaceManager, sessi
         session_id: Current session ID
     """
     # Add user message to chat
-    st.session_state.messages.append({
+    _append_message({
+        "id": uuid.uuid4().hex,
         "role": "user",
         "content": user_input,
         "timestamp": datetime.now()
     })
     
-    # Show user message immediately
-    st.rerun()
+    # Show user message immediately; a rerun here would abort the script
+    # before the response is generated
+    with st.chat_message("user"):
+        st.markdown(user_input)
     
-    # Generate AI response
-    with st.spinner("🤔 Thinking..."):
+    # Generate AI response, streaming it into the page as it arrives
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        placeholder.markdown("🤔 Thinking...")
         try:
-            # Use asyncio to run the async function
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            response = loop.run_until_complete(
-                chat_manager.generate_response(user_input, session_id)
-            )
-            loop.close()
+            chat_history = st.session_state.setdefault("chat_history", [])
+            recent_history = chat_history[-chat_manager.memory_manager.memory_limit:]
+            state_key = _conversation_state_key(recent_history, get_corpus_version())
+            response = _get_cached_response(state_key, user_input)
+            
+            if response is None:
+                response = _stream_response(
+                    user_input, session_id, chat_manager, recent_history, placeholder
+                )
+                # Only completed responses are cached; errors propagate above
+                _cache_response(state_key, user_input, response)
+            else:
+                # The query pipeline did not run, so store the turn here
+                placeholder.markdown(response["response"])
+                chat_manager.run_async(
+                    chat_manager.store_chat_turn(session_id, user_input, response["response"])
+                )
+            
+            # Keep the local history in step with what was stored
+            chat_history.append(ChatMessage(
+                session_id=session_id,
+                turn_index=chat_history[-1].turn_index + 1 if chat_history else 0,
+                user_message=user_input,
+                ai_response=response["response"]
+            ))
             
             # Add AI response to chat
-            st.session_state.messages.append({
+            _append_message({
+                "id": uuid.uuid4().hex,
                 "role": "assistant",
                 "content": response["response"],
                 "timestamp": datetime.now(),
                 "sources": response["sources"]
             })
             
-            # Store the conversation turn
-            chat_manager.store_chat_turn(session_id, user_input, response["response"])
-            
         except Exception as e:
             logger.error(f"Error handling user input: {e}")
-            st.session_state.messages.append({
+            _append_message({
+                "id": uuid.uuid4().hex,
                 "role": "assistant",
                 "content": f"I apologize, but I encountered an error: {str(e)}",
                 "timestamp": datetime.now()
             })
     
-    # Rerun to show the new messages
-    st.rerun()
+    # Rerun just the chat fragment to show the new messages
+    st.rerun(scope="fragment")
 
 
 def render_chat_suggestions():
@@ -415,23 +676,24 @@ def render_chat_suggestions():
     if not st.session_state.get("messages", []):
         st.markdown("#### 💡 Suggested Questions")
         
-        suggestions = [
-            "What are the main topics covered in my documents?",
-            "Summarize the key findings from the uploaded documents",
-            "Find information about specific topics or keywords",
-            "Compare different documents in my collection",
-            "What insights can you provide from my document library?"
-        ]
-        
-        for suggestion in suggestions:
-            if st.button(f"💬 {suggestion}", key=f"suggestion_{hash(suggestion)}"):
-                # Add suggestion as user input
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": suggestion,
-                    "timestamp": datetime.now()
-                })
-                st.rerun()
+        # A single selectbox instead of one button per suggestion
+        suggestion = st.selectbox(
+            "Suggested questions",
+            _SUGGESTION_OPTIONS,
+            key="suggestion_choice",
+            format_func=lambda text: f"💬 {text}" if text else "Pick a question to ask...",
+            label_visibility="collapsed"
+        )
+        
+        if suggestion:
+            # Add suggestion as user input
+            _append_message({
+                "id": uuid.uuid4().hex,
+                "role": "user",
+                "content": suggestion,
+                "timestamp": datetime.now()
+            })
+            st.rerun()
 
 
 def render_chat_stats(session_id: str):
@@ -442,47 +704,51 @@ def render_chat_stats(session_id: str):
         session_id: Current session ID
     """
     with st.expander("📊 Session Statistics", expanded=False):
-        messages = st.session_state.get("messages", [])
-        user_messages = [m for m in messages if m["role"] == "user"]
-        ai_messages = [m for m in messages if m["role"] == "assistant"]
-        
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("User Messages", len(user_messages))
+            st.metric("User Messages", st.session_state.get("_user_count", 0))
         
         with col2:
-            st.metric("AI Responses", len(ai_messages))
+            st.metric("AI Responses", st.session_state.get("_ai_count", 0))
         
         with col3:
-            total_chars = sum(len(m["content"]) for m in messages)
+            total_chars = st.session_state.get("_total_chars", 0)
             st.metric("Total Characters", f"{total_chars:,}")
         
         # Session info
         st.markdown(f"**Session ID:** `{session_id}`")
-        if messages:
-            first_message_time = messages[0].get("timestamp")
-            if first_message_time:
-                st.markdown(f"**Started:** {first_message_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        started = st.session_state.get("_started_str")
+        if started and st.session_state.get("messages"):
+            st.markdown(f"**Started:** {started}")
 
 
+@st.fragment
 def render_chat_interface():
-    """Main function to render the complete chat interface."""
+    """
+    Main function to render the complete chat interface.
+    
+    Runs as a fragment so sending a message reruns only the chat, not the
+    sidebar's upload and document library sections.
+    """
     
-    chat_manager = ChatInterfaceManager()
+    chat_manager = get_chat_manager()
     session_id = chat_manager.ensure_session_id()
     
     # Initialize messages in session state
     if "messages" not in st.session_state:
         st.session_state.messages = []
-        
-        # Load existing chat history
+    
+    # Load stored chat history once per session rather than whenever the
+    # messages list is reset; later turns are appended locally as they happen
+    if st.session_state.get("_history_loaded_for") != session_id:
+        st.session_state._history_loaded_for = session_id
         history = chat_manager.get_chat_history(session_id, limit=20)
+        # Queries reuse this history instead of reading chat memory each turn
+        st.session_state.chat_history = list(history)
         for msg in history:
-            st.session_state.messages.extend([
-                {"role": "user", "content": msg.user_message, "timestamp": msg.created_at},
-                {"role": "assistant", "content": msg.ai_response, "timestamp": msg.created_at}
-            ])
+            _append_message({"id": uuid.uuid4().hex, "role": "user", "content": msg.user_message, "timestamp": msg.created_at})
+            _append_message({"id": uuid.uuid4().hex, "role": "assistant", "content": msg.ai_response, "timestamp": msg.created_at})
     
     # Chat header
     render_chat_header(session_id, chat_manager)
@@ -7,9 +7,10 @@ for managing the user's document library.
 
 import streamlit as st
 import logging
+import threading
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import pandas as pd
+from collections import Counter
 
 from ..db import get_db_client, SupabaseClient
 from ..models import Document, VectorChunk
@@ -17,13 +18,52 @@ from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# Seconds a cached document list or stats snapshot is reused across reruns
+DOCUMENT_CACHE_TTL = 30
+
+# Bumped whenever the library changes, so answers drawn from it can be cached per version
+_corpus_version = 0
+_corpus_version_lock = threading.Lock()
+
+
+@st.cache_data(ttl=DOCUMENT_CACHE_TTL, show_spinner=False)
+def _fetch_documents() -> List[Document]:
+    """Fetch the document list, memoized across Streamlit reruns."""
+    return get_db_client().list_documents()
+
+
+@st.cache_data(ttl=DOCUMENT_CACHE_TTL, show_spinner=False)
+def _fetch_all_stats() -> Dict[str, Dict[str, Any]]:
+    """Fetch per-document chunk statistics, memoized across Streamlit reruns."""
+    return get_db_client().get_all_document_stats()
+
+
+def clear_document_cache():
+    """Drop the cached document list and stats after the library changes."""
+    global _corpus_version
+    _fetch_documents.clear()
+    _fetch_all_stats.clear()
+    with _corpus_version_lock:
+        _corpus_version += 1
+
+
+def get_corpus_version() -> int:
+    """Return a counter that changes whenever documents are added or deleted."""
+    return _corpus_version
+
 
 class DocumentManager:
-    """Manages document operations for the UI."""
+    """
+    Manages document operations for the UI.
+    
+    An instance is request-scoped: render_document_manager builds a fresh one
+    per render, so per-document stats are memoized only for that render.
+    """
     
     def __init__(self):
         """Initialize the document manager."""
         self.db_client = get_db_client()
+        self._stats_cache: Dict[str, Dict[str, Any]] = {}
     
     def get_all_documents(self) -> List[Document]:
         """
@@ -33,7 +73,7 @@ class DocumentManager:
             List of Document objects
         """
         try:
-            return self.db_client.list_documents()
+            return _fetch_documents()
         except Exception as e:
             logger.error(f"Error fetching documents: {e}")
             return []
@@ -48,15 +88,17 @@ class DocumentManager:
         Returns:
             Dictionary with document statistics
         """
+        doc_id = str(doc_id)
+        if doc_id in self._stats_cache:
+            return self._stats_cache[doc_id]
+        
         try:
-            chunks = self.db_client.get_document_vectors(doc_id)
-            
-            return {
-                "chunk_count": len(chunks),
-                "total_content_length": sum(len(chunk.content) for chunk in chunks),
-                "avg_chunk_length": sum(len(chunk.content) for chunk in chunks) / len(chunks) if chunks else 0,
-                "has_embeddings": all(chunk.embedding is not None for chunk in chunks)
-            }
+            stats = self.db_client.get_document_stats(doc_id)
+            stats["avg_chunk_length"] = (
+                stats["total_content_length"] / stats["chunk_count"] if stats["chunk_count"] else 0
+            )
+            self._stats_cache[doc_id] = stats
+            return stats
         except Exception as e:
             logger.error(f"Error getting document stats for {doc_id}: {e}")
             return {
@@ -66,6 +108,48 @@ class DocumentManager:
                 "has_embeddings": False
             }
     
+    def get_stats_bulk(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get statistics for all documents with a single database query.
+        
+        Returns:
+            Dictionary mapping document ID to the same statistics returned by
+            get_document_stats. Documents without chunks are not included;
+            use stats_for to look them up with a default.
+        """
+        try:
+            bulk = _fetch_all_stats()
+        except Exception as e:
+            logger.error(f"Error getting document stats: {e}")
+            return {}
+        
+        return {
+            doc_id: {
+                **stats,
+                "avg_chunk_length": stats["total_content_length"] / stats["chunk_count"] if stats["chunk_count"] else 0
+            }
+            for doc_id, stats in bulk.items()
+        }
+    
+    @staticmethod
+    def stats_for(bulk_stats: Dict[str, Dict[str, Any]], doc_id: str) -> Dict[str, Any]:
+        """
+        Look up a document in the result of get_stats_bulk.
+        
+        Args:
+            bulk_stats: Result of get_stats_bulk
+            doc_id: Document ID
+            
+        Returns:
+            Document statistics, or empty statistics if it has no chunks
+        """
+        return bulk_stats.get(doc_id) or {
+            "chunk_count": 0,
+            "total_content_length": 0,
+            "avg_chunk_length": 0,
+            "has_embeddings": True
+        }
+    
     def delete_document(self, doc_id: str) -> tuple[bool, str]:
         """
         Delete a document and all its associated data.
@@ -79,6 +163,8 @@ class DocumentManager:
         try:
             success = self.db_client.delete_document(doc_id)
             if success:
+                self._stats_cache.pop(str(doc_id), None)
+                clear_document_cache()
                 logger.info(f"Document deleted successfully: {doc_id}")
                 return True, "Document deleted successfully!"
             else:
@@ -90,7 +176,7 @@ class DocumentManager:
     
     def delete_multiple_documents(self, doc_ids: List[str]) -> Dict[str, Any]:
         """
-        Delete multiple documents.
+        Delete multiple documents with a single bulk delete.
         
         Args:
             doc_ids: List of document IDs to delete
@@ -104,20 +190,39 @@ class DocumentManager:
             "total": len(doc_ids)
         }
         
+        try:
+            deleted_ids = set(self.db_client.delete_documents(doc_ids))
+        except Exception as e:
+            logger.error(f"Error deleting documents {doc_ids}: {e}")
+            results["failed"] = [
+                {"doc_id": doc_id, "error": f"Error deleting document: {str(e)}"}
+                for doc_id in doc_ids
+            ]
+            return results
+        
         for doc_id in doc_ids:
-            success, message = self.delete_document(doc_id)
-            if success:
+            if str(doc_id) in deleted_ids:
                 results["successful"].append(doc_id)
             else:
-                results["failed"].append({"doc_id": doc_id, "error": message})
+                results["failed"].append({"doc_id": doc_id, "error": "Failed to delete document."})
+        
+        if results["successful"]:
+            for doc_id in results["successful"]:
+                self._stats_cache.pop(str(doc_id), None)
+            clear_document_cache()
         
         return results
 
 
-
-
+@st.fragment
 def render_document_list(documents: List[Document], doc_manager: DocumentManager):
-    """Render documents as a simple list with basic operations."""
+    """
+    Render documents as a simple list with basic operations.
+    
+    Runs as a fragment so toggling a checkbox reruns only this list, reusing
+    the documents passed in on the last full run. Deletions trigger a full
+    app rerun to refresh the library.
+    """
     
     # Bulk operations
     st.markdown("#### 🗂️ Document Library")
@@ -125,35 +230,29 @@ def render_document_list(documents: List[Document], doc_manager: DocumentManager
     # Select all checkbox
     select_all = st.checkbox("Select all documents")
     
-    selected_docs = []
-    
-    # Document list
-    for i, doc in enumerate(documents):
-        col1, col2, col3, col4 = st.columns([0.5, 3, 1.5, 1])
-        
-        with col1:
-            # Individual checkbox
-            selected = st.checkbox(
-                f"Select {doc.filename}", 
-                value=select_all,
-                key=f"doc_select_{doc.id}",
-                label_visibility="collapsed"
-            )
-            if selected:
-                selected_docs.append(doc)
-        
-        with col2:
-            st.write(f"📄 **{doc.filename}**")
-            st.caption(f"Uploaded: {doc.uploaded_at.strftime('%Y-%m-%d %H:%M')}")
-        
-        with col3:
-            # Get document stats
-            stats = doc_manager.get_document_stats(str(doc.id))
-            st.write(f"📝 {stats['chunk_count']} chunks")
-        
-        with col4:
-            if st.button("🗑️", key=f"delete_{doc.id}", help="Delete document"):
-                delete_single_document(doc, doc_manager)
+    bulk_stats = doc_manager.get_stats_bulk()
+    rows = [
+        {
+            "Select": select_all,
+            "Document": f"📄 {doc.filename}",
+            "Uploaded": doc.uploaded_at.strftime('%Y-%m-%d %H:%M'),
+            "Chunks": doc_manager.stats_for(bulk_stats, str(doc.id))['chunk_count']
+        }
+        for doc in documents
+    ]
+    
+    # Document list as a single grid; only the Select column is editable.
+    # The key includes select_all so toggling it resets individual picks.
+    editor_key = f"document_list_editor_{select_all}"
+    edited_rows = st.data_editor(
+        rows,
+        column_config={"Select": st.column_config.CheckboxColumn(width="small")},
+        disabled=["Document", "Uploaded", "Chunks"],
+        hide_index=True,
+        width="stretch",
+        key=editor_key
+    )
+    selected_docs = [doc for doc, row in zip(documents, edited_rows) if row["Select"]]
     
     # Bulk delete operation
     if selected_docs:
@@ -164,11 +263,12 @@ def render_document_list(documents: List[Document], doc_manager: DocumentManager
             st.write(f"**{len(selected_docs)} documents selected**")
         
         with col2:
-            if st.button("🗑️ Delete Selected", use_container_width=True, type="primary"):
+            if st.button("🗑️ Delete Selected", width="stretch", type="primary"):
                 delete_multiple_documents(selected_docs, doc_manager)
         
         with col3:
-            if st.button("❌ Clear Selection", use_container_width=True):
+            if st.button("❌ Clear Selection", width="stretch"):
+                st.session_state.pop(editor_key, None)
                 st.rerun()
 
 
@@ -177,27 +277,25 @@ def render_document_details(documents: List[Document], doc_manager: DocumentMana
     
     st.markdown("#### 📊 Detailed Document View")
     
-    # Create a dataframe for better visualization
+    # Build table rows for better visualization
     doc_data = []
+    bulk_stats = doc_manager.get_stats_bulk()
     for doc in documents:
-        stats = doc_manager.get_document_stats(str(doc.id))
+        stats = doc_manager.stats_for(bulk_stats, str(doc.id))
         doc_data.append({
             "Document": doc.filename,
             "Uploaded": doc.uploaded_at.strftime('%Y-%m-%d %H:%M'),
             "Chunks": stats['chunk_count'],
             "Content Size": f"{stats['total_content_length']:,} chars",
             "Avg Chunk Size": f"{stats['avg_chunk_length']:.0f} chars",
-            "Embeddings": "✓" if stats['has_embeddings'] else "✗",
-            "ID": str(doc.id)
+            "Embeddings": "✓" if stats['has_embeddings'] else "✗"
         })
     
     if doc_data:
-        df = pd.DataFrame(doc_data)
-        
-        # Display the dataframe
+        # Display the table
         st.dataframe(
-            df.drop('ID', axis=1),  # Hide ID column from display
-            use_container_width=True,
+            doc_data,
+            width="stretch",
             hide_index=True
         )
         
@@ -206,30 +304,26 @@ def render_document_details(documents: List[Document], doc_manager: DocumentMana
         st.markdown("#### 🛠️ Document Actions")
         
         # Document selection for actions
-        selected_doc = st.selectbox(
+        selected_document = st.selectbox(
             "Select a document for actions:",
-            options=[(doc['Document'], doc['ID']) for doc in doc_data],
-            format_func=lambda x: x[0],
+            options=documents,
+            format_func=lambda doc: doc.filename,
             index=None
         )
         
-        if selected_doc:
-            doc_name, doc_id = selected_doc
-            selected_document = next((doc for doc in documents if str(doc.id) == doc_id), None)
+        if selected_document:
+            col1, col2, col3 = st.columns([1, 1, 2])
             
-            if selected_document:
-                col1, col2, col3 = st.columns([1, 1, 2])
-                
-                with col1:
-                    if st.button("📊 View Details", use_container_width=True):
-                        show_document_details(selected_document, doc_manager)
-                
-                with col2:
-                    if st.button("🗑️ Delete", use_container_width=True, type="primary"):
-                        delete_single_document(selected_document, doc_manager)
-                
-                with col3:
-                    st.write("")  # Spacer
+            with col1:
+                if st.button("📊 View Details", width="stretch"):
+                    show_document_details(selected_document, doc_manager)
+            
+            with col2:
+                if st.button("🗑️ Delete", width="stretch", type="primary"):
+                    delete_single_document(selected_document, doc_manager)
+            
+            with col3:
+                st.write("")  # Spacer
 
 
 def show_document_details(document: Document, doc_manager: DocumentManager):
@@ -258,15 +352,14 @@ def show_document_details(document: Document, doc_manager: DocumentManager):
             st.markdown("**Sample Content:**")
             try:
                 from uuid import UUID
-                chunks = doc_manager.db_client.get_document_vectors(UUID(str(document.id)))
-                if chunks:
-                    # Show first few chunks
-                    for i, chunk in enumerate(chunks[:3]):
-                        with st.expander(f"Chunk {chunk.chunk_id}", expanded=False):
-                            st.text(chunk.content[:500] + "..." if len(chunk.content) > 500 else chunk.content)
-                    
-                    if len(chunks) > 3:
-                        st.caption(f"... and {len(chunks) - 3} more chunks")
+                # Show first few chunks
+                chunks = doc_manager.db_client.get_document_vectors_preview(UUID(str(document.id)), limit=3)
+                for chunk in chunks:
+                    with st.expander(f"Chunk {chunk.chunk_id}", expanded=False):
+                        st.text(chunk.content[:500] + "..." if len(chunk.content) > 500 else chunk.content)
+                
+                if stats['chunk_count'] > len(chunks):
+                    st.caption(f"... and {stats['chunk_count'] - len(chunks)} more chunks")
             except Exception as e:
                 st.error(f"Error loading chunks: {e}")
 
@@ -357,11 +450,8 @@ def delete_multiple_documents(documents: List[Document], doc_manager: DocumentMa
         st.rerun()
 
 
-def render_document_statistics():
+def render_document_statistics(doc_manager: DocumentManager, documents: List[Document]):
     """Render overall document library statistics."""
-    doc_manager = DocumentManager()
-    documents = doc_manager.get_all_documents()
-    
     if not documents:
         return
     
@@ -371,8 +461,9 @@ def render_document_statistics():
     total_size = 0
     docs_with_embeddings = 0
     
+    bulk_stats = doc_manager.get_stats_bulk()
     for doc in documents:
-        stats = doc_manager.get_document_stats(str(doc.id))
+        stats = doc_manager.stats_for(bulk_stats, str(doc.id))
         total_chunks += stats['chunk_count']
         total_size += stats['total_content_length']
         if stats['has_embeddings']:
@@ -397,16 +488,22 @@ def render_document_statistics():
         st.metric("Embeddings Complete", f"{embedding_percentage:.0f}%")
 
 
+@st.fragment
 def render_document_manager():
-    """Main function to render the complete document management interface."""
+    """
+    Main function to render the complete document management interface.
     
-    # Overall statistics
-    render_document_statistics()
+    Runs as a fragment so switching views or documents does not rerun the
+    chat. Uploads still run the whole app, so new documents show up here.
+    """
     
-    # Main document management interface
+    # One manager per render, shared by every section below
     doc_manager = DocumentManager()
     documents = doc_manager.get_all_documents()
     
+    # Overall statistics
+    render_document_statistics(doc_manager, documents)
+    
     if not documents:
         st.info("📭 No documents uploaded yet.")
         st.markdown("Use the **Upload Documents** section above to add documents to your library.")
@@ -429,16 +526,19 @@ def render_document_manager():
             render_document_details(documents, doc_manager)
     
     with tab2:
-        render_document_statistics()
+        render_document_statistics(doc_manager, documents)
         
         # Additional analytics could go here
         st.markdown("#### 📅 Upload Timeline")
         if documents:
             # Create a simple timeline visualization
-            upload_dates = [doc.uploaded_at.date() for doc in documents]
-            upload_counts = pd.Series(upload_dates).value_counts().sort_index()
+            upload_counts = Counter(doc.uploaded_at.date() for doc in documents)
             
-            if len(upload_counts) > 0:
-                st.bar_chart(upload_counts)
+            if upload_counts:
+                st.bar_chart(
+                    [{"Date": date, "Uploads": count} for date, count in sorted(upload_counts.items())],
+                    x="Date",
+                    y="Uploads"
+                )
             else:
                 st.info("No upload timeline data available.")
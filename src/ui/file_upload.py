@@ -7,17 +7,20 @@ file type validation, and integration with the document ingestion pipeline.
 
 import streamlit as st
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 import tempfile
 import os
+import shutil
+import hashlib
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 
 from ..config import settings
 from ..ingest import DocumentIngestionPipeline, ConversionResult
 from ..models import Document
+from .document_manager import clear_document_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,7 +29,7 @@ class FileUploadManager:
     """Manages file upload and processing operations."""
     
     # Supported file extensions
-    SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt', '.html', '.md', '.htm'}
+    SUPPORTED_EXTENSIONS = frozenset({'.pdf', '.docx', '.txt', '.html', '.md', '.htm'})
     
     def __init__(self):
         """Initialize the file upload manager."""
@@ -50,7 +53,8 @@ class FileUploadManager:
             return False, f"File size exceeds {settings.max_file_size_mb}MB limit"
         
         # Check file extension
-        file_extension = Path(uploaded_file.name).suffix.lower()
+        name = uploaded_file.name
+        file_extension = '.' + name.rpartition('.')[2].lower() if '.' in name else ''
         if file_extension not in self.SUPPORTED_EXTENSIONS:
             return False, f"Unsupported file type. Supported types: {', '.join(self.SUPPORTED_EXTENSIONS)}"
         
@@ -60,6 +64,10 @@ class FileUploadManager:
         """
         Save uploaded file to temporary directory.
         
+        Each file gets its own subdirectory, so uploads with the same name
+        that are processed concurrently never overwrite each other while
+        the original name is kept for display.
+        
         Args:
             uploaded_file: Streamlit uploaded file object
             temp_dir: Temporary directory path
@@ -67,25 +75,40 @@ class FileUploadManager:
         Returns:
             Path to saved file
         """
-        file_path = temp_dir / uploaded_file.name
+        file_path = Path(tempfile.mkdtemp(dir=temp_dir)) / uploaded_file.name
         
+        # Stream in 1MB blocks instead of copying the whole upload into a buffer
+        uploaded_file.seek(0)
         with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+            shutil.copyfileobj(uploaded_file, f, length=1 << 20)
         
         return file_path
     
-    def process_file(self, file_path: Path) -> ConversionResult:
+    def compute_digest(self, uploaded_file) -> str:
+        """
+        Compute the SHA-256 digest of an uploaded file's content.
+        
+        Args:
+            uploaded_file: Streamlit uploaded file object
+            
+        Returns:
+            Hex digest used to detect files that were already ingested
+        """
+        return hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+    
+    def process_file(self, file_path: Path, content_sha256: Optional[str] = None) -> ConversionResult:
         """
         Process a single file through the ingestion pipeline.
         
         Args:
             file_path: Path to the file to process
+            content_sha256: Digest from compute_digest, to skip duplicate content
             
         Returns:
             ConversionResult with processing results
         """
         try:
-            return self.ingestion_pipeline.ingest_document(str(file_path))
+            return self.ingestion_pipeline.ingest_document(str(file_path), content_sha256=content_sha256)
         except Exception as e:
             logger.error(f"Error processing file {file_path}: {e}")
             from uuid import UUID
@@ -98,12 +121,72 @@ class FileUploadManager:
             )
 
 
+@st.cache_resource
+def get_upload_manager() -> FileUploadManager:
+    """Get the process-wide FileUploadManager, so its ingestion pipeline is built once."""
+    return FileUploadManager()
+
+
+def _validate_save_process(uploaded_file, temp_path: Path, upload_manager: FileUploadManager) -> Dict[str, Any]:
+    """
+    Validate, save and ingest one uploaded file.
+    
+    Runs on a worker thread, so it must not call any Streamlit APIs.
+    
+    Args:
+        uploaded_file: Streamlit uploaded file object
+        temp_path: Temporary directory to save the file into
+        upload_manager: FileUploadManager instance
+        
+    Returns:
+        Upload result with a "status" of "success", or a failure record with an "error"
+    """
+    # Validate file
+    is_valid, validation_message = upload_manager.validate_file(uploaded_file)
+    if not is_valid:
+        return {
+            "filename": uploaded_file.name,
+            "error": validation_message
+        }
+    
+    try:
+        content_sha256 = upload_manager.compute_digest(uploaded_file)
+        
+        # Save file to temporary location
+        file_path = upload_manager.save_uploaded_file(uploaded_file, temp_path)
+        
+        # Process file through ingestion pipeline
+        result = upload_manager.process_file(file_path, content_sha256)
+        
+        if result.conversion_status == "success":
+            return {
+                "filename": uploaded_file.name,
+                "doc_id": result.doc_id,
+                "chunks": result.chunks_created,
+                "status": result.conversion_status
+            }
+        return {
+            "filename": uploaded_file.name,
+            "error": result.error_message or "Unknown error"
+        }
+        
+    except Exception as e:
+        logger.error(f"Unexpected error processing {uploaded_file.name}: {e}")
+        return {
+            "filename": uploaded_file.name,
+            "error": f"Unexpected error: {str(e)}"
+        }
 
 
 def process_uploaded_files(uploaded_files: List, upload_manager: FileUploadManager):
     """
     Process multiple uploaded files with progress tracking.
     
+    Files are ingested concurrently on a thread pool, since ingestion mostly
+    waits on the embedding API and Supabase. The shared pipeline serializes
+    Docling conversion and chunking, which are not thread-safe. The status
+    widget is only updated from the script thread as results come in.
+    
     Args:
         uploaded_files: List of Streamlit uploaded file objects
         upload_manager: FileUploadManager instance
@@ -114,60 +197,42 @@ def process_uploaded_files(uploaded_files: List, upload_manager: FileUploadManag
         
         # Progress tracking
         total_files = len(uploaded_files)
-        progress_bar = st.progress(0)
-        status_text = st.empty()
         results_container = st.container()
         
         # Results tracking
         successful_uploads = []
         failed_uploads = []
         
-        for i, uploaded_file in enumerate(uploaded_files):
-            # Update progress
-            progress = (i) / total_files
-            progress_bar.progress(progress)
-            status_text.text(f"Processing {uploaded_file.name}... ({i + 1}/{total_files})")
-            
-            # Validate file
-            is_valid, validation_message = upload_manager.validate_file(uploaded_file)
-            if not is_valid:
-                failed_uploads.append({
-                    "filename": uploaded_file.name,
-                    "error": validation_message
-                })
-                continue
-            
-            try:
-                # Save file to temporary location
-                file_path = upload_manager.save_uploaded_file(uploaded_file, temp_path)
-                
-                # Process file through ingestion pipeline
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    result = upload_manager.process_file(file_path)
+        max_workers = max(1, min(settings.max_concurrent_uploads, total_files))
+        
+        with st.status(f"Processing {total_files} files...", expanded=False) as status:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(_validate_save_process, uploaded_file, temp_path, upload_manager): uploaded_file
+                    for uploaded_file in uploaded_files
+                }
                 
-                if result.conversion_status == "success":
-                    successful_uploads.append({
-                        "filename": uploaded_file.name,
-                        "doc_id": result.doc_id,
-                        "chunks": result.chunks_created,
-                        "status": result.conversion_status
-                    })
-                else:
-                    failed_uploads.append({
-                        "filename": uploaded_file.name,
-                        "error": result.error_message or "Unknown error"
-                    })
+                for completed, future in enumerate(as_completed(futures), start=1):
+                    uploaded_file = futures[future]
+                    result = future.result()
                     
-            except Exception as e:
-                logger.error(f"Unexpected error processing {uploaded_file.name}: {e}")
-                failed_uploads.append({
-                    "filename": uploaded_file.name,
-                    "error": f"Unexpected error: {str(e)}"
-                })
+                    if "error" in result:
+                        failed_uploads.append(result)
+                    else:
+                        successful_uploads.append(result)
+                    
+                    # Update progress
+                    status.update(label=f"Processed {uploaded_file.name} ({completed}/{total_files})")
+            
+            # Complete progress
+            status.update(
+                label="Processing complete!",
+                state="complete" if successful_uploads or not failed_uploads else "error"
+            )
         
-        # Complete progress
-        progress_bar.progress(1.0)
-        status_text.text("Processing complete!")
+        # New documents must show up in the library right away
+        if successful_uploads:
+            clear_document_cache()
         
         # Display results
         display_upload_results(successful_uploads, failed_uploads, results_container)
@@ -217,7 +282,7 @@ def display_upload_results(successful_uploads: List[Dict], failed_uploads: List[
         
         # Clear file uploader after processing
         if successful_uploads or failed_uploads:
-            if st.button("📁 Upload More Files", use_container_width=True):
+            if st.button("📁 Upload More Files", width="stretch"):
                 # Clear the file uploader by rerunning
                 st.rerun()
 
@@ -262,7 +327,7 @@ def render_file_upload():
     show_upload_guidelines()
     
     # Main upload interface
-    upload_manager = FileUploadManager()
+    upload_manager = get_upload_manager()
     
     # File uploader widget
     uploaded_files = st.file_uploader(
@@ -283,7 +348,8 @@ def render_file_upload():
         st.markdown("#### 📋 Selected Files")
         
         valid_files = []
-        for i, file in enumerate(uploaded_files):
+        for file in uploaded_files:
+            is_valid, message = upload_manager.validate_file(file)
             col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
             
             with col1:
@@ -291,22 +357,21 @@ def render_file_upload():
             with col2:
                 st.write(f"{file.size / 1024:.1f} KB")
             with col3:
-                is_valid, message = upload_manager.validate_file(file)
                 if is_valid:
                     st.success("✓ Valid")
                     valid_files.append(file)
                 else:
                     st.error("✗ Invalid")
             with col4:
-                if not upload_manager.validate_file(file)[0]:
-                    st.caption(upload_manager.validate_file(file)[1])
+                if not is_valid:
+                    st.caption(message)
         
         # Show upload button only if there are valid files
         if valid_files:
             st.markdown("---")
             col1, col2 = st.columns([2, 1])
             with col1:
-                if st.button("🚀 Upload and Process Files", use_container_width=True, type="primary"):
+                if st.button("🚀 Upload and Process Files", width="stretch", type="primary"):
                     process_uploaded_files(valid_files, upload_manager)
             with col2:
                 st.metric("Valid Files", len(valid_files))
@@ -34,87 +34,24 @@ st.set_page_config(
 )
 
 # Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        text-align: center;
-        padding: 1rem 0;
-        border-bottom: 2px solid #f0f2f6;
-        margin-bottom: 2rem;
-    }
-    
-    .sidebar-section {
-        padding: 1rem 0;
-        border-bottom: 1px solid #f0f2f6;
-        margin-bottom: 1rem;
-    }
-    
-    .chat-message {
-        padding: 1rem;
-        margin: 0.5rem 0;
-        border-radius: 0.5rem;
-        border-left: 4px solid #ff4b4b;
-    }
-    
-    .user-message {
-        background-color: #f0f2f6;
-        border-left-color: #ff4b4b;
-    }
-    
-    .ai-message {
-        background-color: #e8f4f8;
-        border-left-color: #00c0f2;
-    }
-    
-    .citation {
-        background-color: #fafafa;
-        padding: 0.5rem;
-        margin: 0.5rem 0;
-        border-radius: 0.25rem;
-        border: 1px solid #e0e0e0;
-        font-size: 0.9rem;
-    }
-    
-    .file-upload-area {
-        border: 2px dashed #cccccc;
-        border-radius: 10px;
-        padding: 2rem;
-        text-align: center;
-        margin: 1rem 0;
-    }
-    
-    .upload-success {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 0.75rem;
-        border-radius: 0.25rem;
-        border: 1px solid #c3e6cb;
-        margin: 0.5rem 0;
-    }
-    
-    .upload-error {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 0.75rem;
-        border-radius: 0.25rem;
-        border: 1px solid #f5c6cb;
-        margin: 0.5rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data(show_spinner=False)
+def _load_css() -> str:
+    """Read the app stylesheet once; reruns reuse the cached text."""
+    return (Path(__file__).parent / "static" / "app.css").read_text(encoding="utf-8")
+
+st.markdown(f"<style>{_load_css()}</style>", unsafe_allow_html=True)
 
 def main():
     """Main Streamlit application function."""
     
     # Initialize session state for authentication
-    if "authenticated" not in st.session_state:
-        st.session_state.authenticated = False
-    if "user_id" not in st.session_state:
-        st.session_state.user_id = None
-    if "user_email" not in st.session_state:
-        st.session_state.user_email = None
-    if "session_id" not in st.session_state:
-        st.session_state.session_id = None
+    for key, default in (
+        ("authenticated", False),
+        ("user_id", None),
+        ("user_email", None),
+        ("session_id", None),
+    ):
+        st.session_state.setdefault(key, default)
     
     # Main header
     st.markdown('<div class="main-header">', unsafe_allow_html=True)
@@ -164,8 +101,7 @@ def render_main_app():
         
         if st.button("🚪 Logout", use_container_width=True):
             # Clear all session state
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
+            st.session_state.clear()
             st.rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
@@ -0,0 +1,23 @@
+-- Composite index for chat memory lookups
+--
+-- Every chat memory query (get_chat_memory, _get_next_turn_index and the
+-- turn cleanup in _cleanup_old_messages) filters on session_id and orders or
+-- ranges on turn_index. Indexing turn_index in descending order lets the
+-- "latest N turns" queries read the first N index entries directly, and
+-- _get_next_turn_index becomes an index-only scan of a single tuple.
+--
+-- user_message and ai_response are deliberately not INCLUDEd: long AI
+-- responses would exceed the btree tuple size limit and make inserts fail.
+--
+-- When applying by hand to a large live table, run this statement with
+-- CREATE INDEX CONCURRENTLY outside of a transaction instead.
+CREATE INDEX IF NOT EXISTS idx_chat_histories_session_turn_desc
+ON chat_histories (session_id, turn_index DESC)
+INCLUDE (created_at);
+
+-- Superseded by the index above and by the chat_histories_session_turn_unique
+-- constraint index, so they only add write amplification now
+DROP INDEX IF EXISTS idx_chat_histories_session_turn;
+DROP INDEX IF EXISTS idx_chat_histories_session_id;
+
+COMMENT ON INDEX idx_chat_histories_session_turn_desc IS 'Latest-turns-first lookups for chat memory retrieval';
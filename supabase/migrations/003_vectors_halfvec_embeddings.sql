@@ -0,0 +1,54 @@
+-- Store chunk embeddings as half-precision vectors
+--
+-- halfvec(1536) stores each dimension as FP16, halving embedding storage,
+-- index size and the bytes read per similarity search compared to
+-- VECTOR(1536). Cosine ranking quality for text-embedding-3-small is
+-- unaffected at this precision. Requires pgvector 0.7.0 or newer.
+--
+-- Clients keep sending plain float arrays; pgvector converts them on input.
+
+-- The similarity index is tied to the column type, so rebuild it
+DROP INDEX IF EXISTS idx_vectors_embedding;
+
+ALTER TABLE vectors
+ALTER COLUMN embedding TYPE HALFVEC(1536) USING embedding::HALFVEC(1536);
+
+CREATE INDEX idx_vectors_embedding ON vectors USING ivfflat (embedding halfvec_cosine_ops)
+WITH (lists = 100);
+
+-- The return type changes, so the function has to be dropped and recreated
+DROP FUNCTION IF EXISTS vector_search(VECTOR(1536), INTEGER);
+
+CREATE OR REPLACE FUNCTION vector_search(
+    query_embedding HALFVEC(1536),
+    match_count INTEGER DEFAULT 4
+)
+RETURNS TABLE (
+    id UUID,
+    doc_id UUID,
+    chunk_id INTEGER,
+    content TEXT,
+    embedding HALFVEC(1536),
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        v.id,
+        v.doc_id,
+        v.chunk_id,
+        v.content,
+        v.embedding,
+        v.metadata,
+        1 - (v.embedding <=> query_embedding) AS similarity
+    FROM vectors v
+    WHERE v.embedding IS NOT NULL
+    ORDER BY v.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION vector_search TO authenticated;
+
+COMMENT ON COLUMN vectors.embedding IS 'Half-precision vector embedding from OpenAI text-embedding-3-small (1536 dimensions)';
@@ -0,0 +1,14 @@
+-- Cache the prompt token count of each conversation turn
+--
+-- token_count holds the cl100k_base token count of user_message + ai_response,
+-- computed once when the turn is stored. get_chat_memory uses it to trim
+-- history to a token budget without re-tokenizing every turn on each query.
+ALTER TABLE chat_histories
+ADD COLUMN IF NOT EXISTS token_count INTEGER;
+
+-- Estimate counts for existing turns (roughly four characters per token)
+UPDATE chat_histories
+SET token_count = (LENGTH(user_message) + LENGTH(ai_response) + 3) / 4
+WHERE token_count IS NULL;
+
+COMMENT ON COLUMN chat_histories.token_count IS 'Cached prompt token count of user_message + ai_response';
@@ -0,0 +1,12 @@
+-- Make the database the only source of chat turn timestamps
+--
+-- store_chat_turn no longer sends created_at, so every row takes the server
+-- default. That keeps timestamps consistent across workers with skewed
+-- clocks; NOT NULL guarantees the ordering column is always populated.
+UPDATE chat_histories
+SET created_at = NOW()
+WHERE created_at IS NULL;
+
+ALTER TABLE chat_histories
+ALTER COLUMN created_at SET DEFAULT NOW(),
+ALTER COLUMN created_at SET NOT NULL;
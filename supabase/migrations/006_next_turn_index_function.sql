@@ -0,0 +1,15 @@
+-- Scalar RPC for the next chat turn index of a session
+--
+-- Returns a single integer instead of a one-row JSON array, and is answered
+-- from idx_chat_histories_session_turn_desc with an index-only scan.
+CREATE OR REPLACE FUNCTION next_turn_index(p_session_id TEXT)
+RETURNS INTEGER
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT COALESCE(MAX(turn_index) + 1, 0)
+    FROM chat_histories
+    WHERE session_id = p_session_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION next_turn_index TO authenticated;
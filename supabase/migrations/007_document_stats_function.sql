@@ -0,0 +1,26 @@
+-- Per-document chunk statistics in a single round-trip
+--
+-- The document manager used to download every chunk (content and embedding)
+-- of every document just to count them. This aggregates on the server and
+-- returns one row per document that has chunks; documents without chunks are
+-- simply absent from the result.
+CREATE OR REPLACE FUNCTION document_stats()
+RETURNS TABLE (
+    doc_id UUID,
+    chunk_count INTEGER,
+    total_content_length BIGINT,
+    has_embeddings BOOLEAN
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        v.doc_id,
+        COUNT(*)::INTEGER AS chunk_count,
+        COALESCE(SUM(CHAR_LENGTH(v.content)), 0) AS total_content_length,
+        BOOL_AND(v.embedding IS NOT NULL) AS has_embeddings
+    FROM vectors v
+    GROUP BY v.doc_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION document_stats TO authenticated;
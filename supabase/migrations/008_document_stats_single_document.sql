@@ -0,0 +1,29 @@
+-- Optional document filter for document_stats
+--
+-- The document details panel needs stats for one document and used to
+-- download all of its chunks (content and embedding) to compute them. With
+-- p_doc_id set, the same aggregate runs for that document only, using
+-- idx_vectors_doc_id. Called without arguments it behaves as before.
+DROP FUNCTION IF EXISTS document_stats();
+
+CREATE OR REPLACE FUNCTION document_stats(p_doc_id UUID DEFAULT NULL)
+RETURNS TABLE (
+    doc_id UUID,
+    chunk_count INTEGER,
+    total_content_length BIGINT,
+    has_embeddings BOOLEAN
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        v.doc_id,
+        COUNT(*)::INTEGER AS chunk_count,
+        COALESCE(SUM(CHAR_LENGTH(v.content)), 0) AS total_content_length,
+        BOOL_AND(v.embedding IS NOT NULL) AS has_embeddings
+    FROM vectors v
+    WHERE p_doc_id IS NULL OR v.doc_id = p_doc_id
+    GROUP BY v.doc_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION document_stats TO authenticated;
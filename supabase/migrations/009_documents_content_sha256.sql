@@ -0,0 +1,12 @@
+-- Content digest for uploaded documents
+--
+-- The upload flow hashes each file and looks the digest up before running
+-- Docling and the embedding API, so re-uploading the same file is skipped.
+-- The partial unique index serves that lookup and keeps two concurrent
+-- uploads of the same content from both being stored. Documents ingested
+-- before this migration have no digest and are never matched.
+ALTER TABLE documents ADD COLUMN content_sha256 TEXT;
+
+CREATE UNIQUE INDEX idx_documents_content_sha256
+    ON documents(content_sha256)
+    WHERE content_sha256 IS NOT NULL;
@@ -0,0 +1,39 @@
+-- Stop returning chunk embeddings from vector_search
+--
+-- Ranking happens in this query; callers only use the content, metadata and
+-- similarity of the matches. Returning each match's 1536-dimension embedding
+-- meant serializing, sending and JSON-decoding thousands of floats per query
+-- for nothing.
+
+-- The return type changes, so the function has to be dropped and recreated
+DROP FUNCTION IF EXISTS vector_search(HALFVEC(1536), INTEGER);
+
+CREATE OR REPLACE FUNCTION vector_search(
+    query_embedding HALFVEC(1536),
+    match_count INTEGER DEFAULT 4
+)
+RETURNS TABLE (
+    id UUID,
+    doc_id UUID,
+    chunk_id INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        v.id,
+        v.doc_id,
+        v.chunk_id,
+        v.content,
+        v.metadata,
+        1 - (v.embedding <=> query_embedding) AS similarity
+    FROM vectors v
+    WHERE v.embedding IS NOT NULL
+    ORDER BY v.embedding <=> query_embedding
+    LIMIT match_count;
+$$;
+
+GRANT EXECUTE ON FUNCTION vector_search TO authenticated;
@@ -2,6 +2,7 @@
 
 import os
 import pytest
+from types import SimpleNamespace
 from typing import Generator
 from unittest.mock import Mock, patch
 from uuid import uuid4
@@ -30,10 +31,8 @@ def mock_supabase_client():
     mock_client = Mock()
     mock_admin_client = Mock()
     
-    # Mock successful responses
-    mock_response = Mock()
-    mock_response.data = []
-    mock_response.error = None
+    # Mock successful responses; plain attributes, no call tracking needed
+    mock_response = SimpleNamespace(data=[], error=None)
     
     mock_client.table.return_value.select.return_value.execute.return_value = mock_response
     mock_client.table.return_value.insert.return_value.execute.return_value = mock_response
@@ -44,6 +43,23 @@ def mock_supabase_client():
     return mock_client
 
 
+@pytest.fixture
+def wire_chain():
+    """Return a helper that makes a mock query chain respond with the given rows.
+    
+    The chain is written as the dotted calls the code makes, for example
+    wire_chain(client, "table.select.eq.execute", [row]).
+    """
+    def _wire(mock, chain: str, data):
+        *steps, last = chain.split(".")
+        node = mock
+        for step in steps:
+            node = getattr(node, step).return_value
+        getattr(node, last).return_value = SimpleNamespace(data=data)
+    
+    return _wire
+
+
 @pytest.fixture
 def mock_db_client(mock_supabase_client):
     """Mock database client fixture."""
@@ -54,7 +70,8 @@ def mock_db_client(mock_supabase_client):
         yield db_client
 
 
-@pytest.fixture
+# Sample data fixtures are read-only in tests, so build them once per module
+@pytest.fixture(scope="module")
 def sample_document():
     """Sample document fixture."""
     return Document(
@@ -64,10 +81,11 @@ def sample_document():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_vector_chunk():
     """Sample vector chunk fixture."""
-    return VectorChunk(
+    # Fields are already the right types; skip validating 1536 floats
+    return VectorChunk.model_construct(
         id=uuid4(),
         doc_id=uuid4(),
         chunk_id=0,
@@ -77,7 +95,7 @@ def sample_vector_chunk():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def sample_chat_message():
     """Sample chat message fixture."""
     return ChatMessage(
@@ -90,12 +108,48 @@ def sample_chat_message():
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
+def sample_document_row(sample_document):
+    """Database row for sample_document."""
+    return {
+        "id": str(sample_document.id),
+        "filename": sample_document.filename,
+        "uploaded_at": sample_document.uploaded_at
+    }
+
+
+@pytest.fixture(scope="module")
+def sample_vector_chunk_row(sample_vector_chunk):
+    """Database row for sample_vector_chunk."""
+    return {
+        "id": str(sample_vector_chunk.id),
+        "doc_id": str(sample_vector_chunk.doc_id),
+        "chunk_id": sample_vector_chunk.chunk_id,
+        "content": sample_vector_chunk.content,
+        "embedding": sample_vector_chunk.embedding,
+        "metadata": sample_vector_chunk.metadata
+    }
+
+
+@pytest.fixture(scope="module")
+def sample_chat_message_row(sample_chat_message):
+    """Database row for sample_chat_message."""
+    return {
+        "id": str(sample_chat_message.id),
+        "session_id": sample_chat_message.session_id,
+        "turn_index": sample_chat_message.turn_index,
+        "user_message": sample_chat_message.user_message,
+        "ai_response": sample_chat_message.ai_response,
+        "created_at": sample_chat_message.created_at
+    }
+
+
+@pytest.fixture(scope="module")
 def sample_vectors_list(sample_vector_chunk):
     """Sample list of vector chunks."""
     vectors = []
     for i in range(3):
-        vector = VectorChunk(
+        vector = VectorChunk.model_construct(
             id=uuid4(),
             doc_id=sample_vector_chunk.doc_id,
             chunk_id=i,
@@ -107,19 +161,36 @@ def sample_vectors_list(sample_vector_chunk):
     return vectors
 
 
+@pytest.fixture(scope="module")
+def sample_vectors_payload(sample_vectors_list):
+    """Rows insert_vectors should send for sample_vectors_list."""
+    return [
+        {
+            "doc_id": str(vector.doc_id),
+            "chunk_id": vector.chunk_id,
+            "content": vector.content,
+            "embedding": vector.embedding,
+            "metadata": vector.metadata
+        }
+        for vector in sample_vectors_list
+    ]
+
+
 @pytest.fixture
 def mock_openai_client():
     """Mock OpenAI client for testing."""
     mock_client = Mock()
     
-    # Mock embedding response
-    mock_embedding_response = Mock()
-    mock_embedding_response.data = [Mock(embedding=[0.1, 0.2, 0.3] * 512)]
+    # Mock batched embedding response (one item per input text)
+    mock_embedding_response = SimpleNamespace(
+        data=[SimpleNamespace(embedding=[0.1, 0.2, 0.3] * 512) for _ in range(3)]
+    )
     mock_client.embeddings.create.return_value = mock_embedding_response
     
     # Mock chat completion response
-    mock_chat_response = Mock()
-    mock_chat_response.choices = [Mock(message=Mock(content="Test response"))]
+    mock_chat_response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="Test response"))]
+    )
     mock_client.chat.completions.create.return_value = mock_chat_response
     
     return mock_client
@@ -132,8 +203,7 @@ def mock_docling_converter():
     mock_document = Mock()
     mock_document.export_to_markdown.return_value = "# Test Document\n\nTest content"
     
-    mock_result = Mock()
-    mock_result.document = mock_document
+    mock_result = SimpleNamespace(document=mock_document)
     
     mock_converter.convert.return_value = mock_result
     return mock_converter
@@ -145,12 +215,10 @@ def mock_docling_chunker():
     mock_chunker = Mock()
     
     # Mock chunk objects
-    mock_chunks = []
-    for i in range(3):
-        mock_chunk = Mock()
-        mock_chunk.text = f"Test chunk {i} content"
-        mock_chunk.meta = {"page": i + 1, "chunk": i}
-        mock_chunks.append(mock_chunk)
+    mock_chunks = [
+        SimpleNamespace(text=f"Test chunk {i} content", meta={"page": i + 1, "chunk": i})
+        for i in range(3)
+    ]
     
     mock_chunker.chunk.return_value = iter(mock_chunks)
     return mock_chunker
@@ -172,13 +240,13 @@ def test_file_content():
     return "This is a test document with multiple sentences. It contains various information for testing purposes. The content should be long enough to create multiple chunks during processing."
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_query_embedding():
     """Sample query embedding for testing."""
     return [0.1, 0.2, 0.3] * 512  # Mock 1536-dimensional embedding
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def test_session_id():
     """Test session ID."""
     return "test-session-123"
@@ -201,13 +269,24 @@ def pytest_configure(config):
     )
 
 
-# Skip integration tests if no database connection
+def pytest_addoption(parser):
+    """Add the opt-in flag for integration tests."""
+    parser.addoption(
+        "--run-integration",
+        action="store_true",
+        default=False,
+        help="Run integration tests against real Supabase and OpenAI services"
+    )
+
+
+# Integration tests talk to real services, so they only run when asked for
 def pytest_collection_modifyitems(config, items):
     """Modify test collection to handle environment-specific tests."""
-    skip_integration = pytest.mark.skip(reason="Database connection not available")
+    if config.getoption("--run-integration"):
+        return
+    
+    skip_integration = pytest.mark.skip(reason="Integration test; run with --run-integration")
     
     for item in items:
         if "integration" in item.keywords:
-            # Check if we should skip integration tests
-            if os.getenv("SKIP_INTEGRATION_TESTS", "false").lower() == "true":
-                item.add_marker(skip_integration)
+            item.add_marker(skip_integration)
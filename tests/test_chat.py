@@ -8,7 +8,9 @@ Author: RAG AI Agent Team
 Date: 2024-12-19
 """
 
+import asyncio
 import pytest
+import uuid
 from unittest.mock import Mock, patch, AsyncMock
 from typing import List
 
@@ -35,6 +37,7 @@ class TestChatOrchestrator:
         """Mock query processor."""
         processor = Mock()
         processor.search_documents = AsyncMock()
+        processor.embed_query = AsyncMock(return_value=[0.1] * 1536)
         return processor
 
     @pytest.fixture
@@ -51,10 +54,11 @@ class TestChatOrchestrator:
         with patch('src.chat.get_settings', return_value=mock_config), \
              patch('src.chat.get_query_processor', return_value=mock_query_processor), \
              patch('src.chat.get_memory_manager', return_value=mock_memory_manager), \
-             patch('src.chat.OpenAI') as mock_openai:
+             patch('src.chat.AsyncOpenAI') as mock_openai:
             
             orchestrator = ChatOrchestrator()
             orchestrator.openai_client = mock_openai.return_value
+            orchestrator.openai_client.chat.completions.create = AsyncMock()
             orchestrator.query_processor = mock_query_processor
             orchestrator.memory_manager = mock_memory_manager
             return orchestrator
@@ -62,7 +66,6 @@ class TestChatOrchestrator:
     @pytest.fixture
     def sample_chunks(self):
         """Sample vector chunks for testing."""
-        import uuid
         return [
             VectorChunk(
                 id=uuid.uuid4(),
@@ -85,7 +88,6 @@ class TestChatOrchestrator:
     @pytest.fixture
     def sample_chat_history(self):
         """Sample chat history for testing."""
-        import uuid
         return [
             ChatMessage(
                 id=uuid.uuid4(),
@@ -170,11 +172,120 @@ class TestChatOrchestrator:
         chat_orchestrator.query_processor.search_documents.assert_called_once_with(
             query, top_k=4, similarity_threshold=0.7
         )
-        chat_orchestrator.memory_manager.get_chat_memory.assert_called_once_with(session_id)
+        chat_orchestrator.memory_manager.get_chat_memory.assert_called_once_with(
+            session_id, token_budget=chat_orchestrator.MAX_HISTORY_TOKENS
+        )
         chat_orchestrator.generate_response.assert_called_once_with(
             query, sample_chunks, sample_chat_history
         )
+        
+        # The turn is stored in the background after the response is returned
         chat_orchestrator.memory_manager.store_chat_turn.assert_called_once()
+        chat_orchestrator.memory_manager.store_chat_turn.assert_not_awaited()
+        await asyncio.sleep(0)
+        chat_orchestrator.memory_manager.store_chat_turn.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_process_query_cache_hit(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test that a near-identical query over the same context reuses the response."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+        chat_orchestrator.memory_manager.get_chat_memory.return_value = sample_chat_history
+        chat_orchestrator.generate_response = AsyncMock(return_value="ML is a subset of AI [Source 1].")
+
+        first, _ = await chat_orchestrator.process_query("What is machine learning?", "session-123")
+        chat_orchestrator.query_processor.embed_query.return_value = [0.1] * 1535 + [0.11]
+        second, context = await chat_orchestrator.process_query("what is machine learning", "session-123")
+
+        assert second == first
+        assert context == sample_chunks
+        chat_orchestrator.generate_response.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_process_query_cache_miss_on_new_history(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test that the same query with a different conversation is answered again."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+        chat_orchestrator.memory_manager.get_chat_memory.return_value = sample_chat_history
+        chat_orchestrator.generate_response = AsyncMock(return_value="ML is a subset of AI [Source 1].")
+
+        await chat_orchestrator.process_query("What is machine learning?", "session-123")
+        chat_orchestrator.memory_manager.get_chat_memory.return_value = sample_chat_history[:1]
+        await chat_orchestrator.process_query("What is machine learning?", "session-123")
+
+        assert chat_orchestrator.generate_response.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_prepare_context(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test that document search and chat memory are fetched together."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+        chat_orchestrator.memory_manager.get_chat_memory.return_value = sample_chat_history
+
+        context_chunks, chat_history = await chat_orchestrator.prepare_context(
+            "What is machine learning?", "session-123", top_k=2, similarity_threshold=0.5
+        )
+
+        assert context_chunks == sample_chunks
+        assert chat_history == sample_chat_history
+        chat_orchestrator.query_processor.search_documents.assert_called_once_with(
+            "What is machine learning?", top_k=2, similarity_threshold=0.5
+        )
+        chat_orchestrator.memory_manager.get_chat_memory.assert_called_once_with(
+            "session-123", token_budget=chat_orchestrator.MAX_HISTORY_TOKENS
+        )
+
+    @pytest.mark.asyncio
+    async def test_prepare_context_with_cached_history(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test that history held by the caller skips the chat memory lookup."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+
+        context_chunks, chat_history = await chat_orchestrator.prepare_context(
+            "What is machine learning?", "session-123", chat_history=sample_chat_history
+        )
+
+        assert context_chunks == sample_chunks
+        assert chat_history == sample_chat_history
+        chat_orchestrator.memory_manager.get_chat_memory.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_prepare_context_trims_history_to_token_budget(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test that history held by the caller is cut to the newest turns fitting the budget."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+        chat_orchestrator.MAX_HISTORY_TOKENS = 1
+
+        _, chat_history = await chat_orchestrator.prepare_context(
+            "What is machine learning?", "session-123", chat_history=sample_chat_history
+        )
+
+        assert chat_history == []
+
+    @pytest.mark.asyncio
+    async def test_process_query_stream(self, chat_orchestrator, sample_chunks, sample_chat_history):
+        """Test streamed query processing yields deltas and stores the full turn."""
+        chat_orchestrator.query_processor.search_documents.return_value = sample_chunks
+        chat_orchestrator.memory_manager.get_chat_memory.return_value = sample_chat_history
+        
+        stream_chunks = []
+        for text in ["ML is ", "a subset of AI ", "[Source 1]."]:
+            chunk = Mock()
+            chunk.choices = [Mock()]
+            chunk.choices[0].delta.content = text
+            stream_chunks.append(chunk)
+        async def stream():
+            for chunk in stream_chunks:
+                yield chunk
+        chat_orchestrator.openai_client.chat.completions.create.return_value = stream()
+        
+        sources = []
+        deltas = [
+            delta async for delta in chat_orchestrator.process_query_stream(
+                "What is machine learning?", "session-123", sources=sources
+            )
+        ]
+
+        assert deltas == ["ML is ", "a subset of AI ", "[Source 1]."]
+        assert sources == sample_chunks
+        chat_orchestrator.memory_manager.store_chat_turn.assert_called_once()
+        stored = chat_orchestrator.memory_manager.store_chat_turn.call_args.kwargs
+        assert stored['ai_response'] == "ML is a subset of AI [Source 1]."
 
     @pytest.mark.asyncio
     async def test_process_query_no_context(self, chat_orchestrator, sample_chat_history):
@@ -229,6 +340,19 @@ class TestChatOrchestrator:
         assert context_text in messages[-1]['content']
         assert query in messages[-1]['content']
 
+    def test_build_conversation_messages_caps_history(self, chat_orchestrator):
+        """Test that only the most recent turns are sent to the model."""
+        history = [
+            ChatMessage(session_id="s", turn_index=i, user_message=f"q{i}", ai_response=f"a{i}")
+            for i in range(10)
+        ]
+        
+        messages = chat_orchestrator._build_conversation_messages("query", "context", history)
+        
+        # System + two messages per kept turn + current query
+        assert len(messages) == 2 + 2 * ChatOrchestrator.MAX_HISTORY_TURNS
+        assert messages[1]['content'] == f"q{10 - ChatOrchestrator.MAX_HISTORY_TURNS}"
+
     def test_parse_citations_single(self, chat_orchestrator):
         """Test citation parsing with single sources."""
         text = "Machine learning is important [Source 1]. Deep learning is a subset [Source 2]."
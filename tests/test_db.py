@@ -1,6 +1,12 @@
 """Tests for database client and operations."""
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+from postgrest import SyncQueryRequestBuilder, SyncSingleRequestBuilder
+from postgrest.exceptions import APIError
 from unittest.mock import Mock, patch
 from uuid import uuid4
 
@@ -8,22 +14,34 @@ from src.db import SupabaseClient, get_db_client, init_db_client
 from src.models import Document, VectorChunk, ChatMessage
 
 
+# Embedding of the right dimension for tests that never read its values
+_DUMMY_EMBEDDING = [0.1] * 1536
+
+
+@pytest.fixture(autouse=True)
+def _patch_create_client(request, mock_supabase_client):
+    """Build every SupabaseClient in this module on the mock Supabase client."""
+    if request.node.get_closest_marker("integration"):
+        yield
+        return
+    
+    with patch('src.db.create_client', return_value=mock_supabase_client):
+        yield
+
+
 class TestSupabaseClient:
     """Test cases for SupabaseClient."""
     
     def test_init_client(self, mock_supabase_client):
         """Test client initialization."""
-        with patch('src.db.create_client', return_value=mock_supabase_client):
-            client = SupabaseClient()
-            assert client.client is not None
-            assert client.admin_client is not None
+        client = SupabaseClient()
+        assert client.client is mock_supabase_client
+        assert client.admin_client is mock_supabase_client
     
-    def test_test_connection_success(self, mock_db_client):
+    def test_test_connection_success(self, mock_db_client, wire_chain):
         """Test successful database connection."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = []
-        mock_db_client.client.table.return_value.select.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.select.execute", [])
         
         result = mock_db_client.test_connection()
         assert result is True
@@ -40,16 +58,10 @@ class TestSupabaseClient:
 class TestDocumentOperations:
     """Test cases for document CRUD operations."""
     
-    def test_create_document(self, mock_db_client, sample_document):
+    def test_create_document(self, mock_db_client, wire_chain, sample_document, sample_document_row):
         """Test document creation."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_document.id),
-            "filename": sample_document.filename,
-            "uploaded_at": sample_document.uploaded_at
-        }]
-        mock_db_client.client.table.return_value.insert.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.insert.execute", [sample_document_row])
         
         result = mock_db_client.create_document(sample_document.filename)
         
@@ -57,43 +69,31 @@ class TestDocumentOperations:
         assert result.filename == sample_document.filename
         mock_db_client.client.table.assert_called_with("documents")
     
-    def test_get_document(self, mock_db_client, sample_document):
-        """Test document retrieval."""
-        # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_document.id),
-            "filename": sample_document.filename,
-            "uploaded_at": sample_document.uploaded_at
-        }]
-        mock_db_client.client.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
+    @pytest.mark.parametrize("outcome", ["found", "missing", "error"])
+    def test_get_document(self, mock_db_client, wire_chain, sample_document, sample_document_row, outcome):
+        """Test document retrieval when the row exists, is missing, or the query fails."""
+        if outcome == "error":
+            mock_db_client.client.table.return_value.select.return_value.eq.return_value.execute.side_effect = Exception("Database error")
+            with pytest.raises(Exception, match="Database error"):
+                mock_db_client.get_document(sample_document.id)
+            return
+        
+        rows = [sample_document_row] if outcome == "found" else []
+        wire_chain(mock_db_client.client, "table.select.eq.execute", rows)
         
         result = mock_db_client.get_document(sample_document.id)
         
-        assert isinstance(result, Document)
-        assert result.id == sample_document.id
-        assert result.filename == sample_document.filename
-    
-    def test_get_document_not_found(self, mock_db_client):
-        """Test document retrieval when document doesn't exist."""
-        # Mock empty response
-        mock_response = Mock()
-        mock_response.data = []
-        mock_db_client.client.table.return_value.select.return_value.eq.return_value.execute.return_value = mock_response
-        
-        result = mock_db_client.get_document(uuid4())
-        assert result is None
+        if outcome == "missing":
+            assert result is None
+        else:
+            assert isinstance(result, Document)
+            assert result.id == sample_document.id
+            assert result.filename == sample_document.filename
     
-    def test_list_documents(self, mock_db_client, sample_document):
+    def test_list_documents(self, mock_db_client, wire_chain, sample_document, sample_document_row):
         """Test listing all documents."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_document.id),
-            "filename": sample_document.filename,
-            "uploaded_at": sample_document.uploaded_at
-        }]
-        mock_db_client.client.table.return_value.select.return_value.order.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.select.order.execute", [sample_document_row])
         
         result = mock_db_client.list_documents()
         
@@ -102,45 +102,59 @@ class TestDocumentOperations:
         assert isinstance(result[0], Document)
         assert result[0].filename == sample_document.filename
     
-    def test_delete_document(self, mock_db_client, sample_document):
+    def test_delete_document(self, mock_db_client, wire_chain, sample_document):
         """Test document deletion."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = []
-        mock_db_client.client.table.return_value.delete.return_value.eq.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.delete.eq.execute", [])
         
         result = mock_db_client.delete_document(sample_document.id)
         assert result is True
         mock_db_client.client.table.assert_called_with("documents")
+    
+    @pytest.mark.parametrize("taken", [False, True])
+    def test_set_document_sha256(self, mock_db_client, wire_chain, sample_document, taken):
+        """Test recording a digest, and a digest already held by another document."""
+        if taken:
+            execute = mock_db_client.client.table.return_value.update.return_value.eq.return_value.execute
+            execute.side_effect = APIError({"code": "23505", "message": "duplicate key value"})
+        else:
+            wire_chain(mock_db_client.client, "table.update.eq.execute", [{"id": str(sample_document.id)}])
+        
+        result = mock_db_client.set_document_sha256(sample_document.id, "ab" * 32)
+        
+        assert result is not taken
+        mock_db_client.client.table.return_value.update.assert_called_once_with({"content_sha256": "ab" * 32})
+    
+    def test_delete_documents(self, mock_db_client, wire_chain):
+        """Test bulk document deletion in one request."""
+        doc_ids = [uuid4(), uuid4()]
+        wire_chain(mock_db_client.client, "table.delete.in_.execute", [{"id": str(doc_ids[0])}])
+        
+        result = mock_db_client.delete_documents(doc_ids)
+        
+        assert result == [str(doc_ids[0])]
+        mock_db_client.client.table.return_value.delete.return_value.in_.assert_called_once_with(
+            "id", [str(doc_id) for doc_id in doc_ids]
+        )
 
 
 class TestVectorOperations:
     """Test cases for vector operations."""
     
-    def test_insert_vectors(self, mock_db_client, sample_vectors_list):
-        """Test vector insertion."""
+    def test_insert_vectors(self, mock_db_client, wire_chain, sample_vectors_list, sample_vectors_payload):
+        """Test vector insertion sends all chunks as one batch of rows."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = []
-        mock_db_client.client.table.return_value.insert.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.insert.execute", [])
         
         result = mock_db_client.insert_vectors(sample_vectors_list)
         assert result is True
         mock_db_client.client.table.assert_called_with("vectors")
+        mock_db_client.client.table.return_value.insert.assert_called_once_with(sample_vectors_payload)
     
-    def test_vector_search(self, mock_db_client, sample_vector_chunk, test_query_embedding):
+    def test_vector_search(self, mock_db_client, wire_chain, sample_vector_chunk, sample_vector_chunk_row, test_query_embedding):
         """Test vector similarity search."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_vector_chunk.id),
-            "doc_id": str(sample_vector_chunk.doc_id),
-            "chunk_id": sample_vector_chunk.chunk_id,
-            "content": sample_vector_chunk.content,
-            "embedding": sample_vector_chunk.embedding,
-            "metadata": sample_vector_chunk.metadata
-        }]
-        mock_db_client.client.rpc.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "rpc.execute", [sample_vector_chunk_row])
         
         result = mock_db_client.vector_search(test_query_embedding, top_k=4)
         
@@ -153,44 +167,96 @@ class TestVectorOperations:
             "match_count": 4
         })
     
-    def test_get_document_vectors(self, mock_db_client, sample_vector_chunk):
+    def test_get_document_vectors(self, mock_db_client, wire_chain, sample_vector_chunk, sample_vector_chunk_row):
         """Test getting vectors for a specific document."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_vector_chunk.id),
-            "doc_id": str(sample_vector_chunk.doc_id),
-            "chunk_id": sample_vector_chunk.chunk_id,
-            "content": sample_vector_chunk.content,
-            "embedding": sample_vector_chunk.embedding,
-            "metadata": sample_vector_chunk.metadata
-        }]
-        mock_db_client.client.table.return_value.select.return_value.eq.return_value.order.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.select.eq.order.execute", [sample_vector_chunk_row])
         
-        result = mock_db_client.get_document_vectors(sample_vector_chunk.doc_id)
+        result = mock_db_client.get_document_vectors(sample_vector_chunk.doc_id, include_embedding=True)
         
         assert isinstance(result, list)
         assert len(result) == 1
         assert isinstance(result[0], VectorChunk)
         assert result[0].doc_id == sample_vector_chunk.doc_id
+        mock_db_client.client.table.return_value.select.assert_called_once_with("*")
+    
+    def test_get_document_vectors_without_embeddings(self, mock_db_client, wire_chain, sample_vector_chunk, sample_vector_chunk_row):
+        """Test the embedding column is not downloaded by default."""
+        wire_chain(mock_db_client.client, "table.select.eq.order.execute", [{
+            key: value for key, value in sample_vector_chunk_row.items() if key != "embedding"
+        }])
+        
+        result = mock_db_client.get_document_vectors(sample_vector_chunk.doc_id)
+        
+        assert result[0].embedding is None
+        mock_db_client.client.table.return_value.select.assert_called_once_with("id,doc_id,chunk_id,content,metadata")
+    
+    def test_get_document_vectors_preview(self, mock_db_client, wire_chain, sample_vector_chunk):
+        """Test previewing chunks fetches a limited page without embeddings."""
+        wire_chain(mock_db_client.client, "table.select.eq.order.limit.execute", [{
+            "id": str(sample_vector_chunk.id),
+            "doc_id": str(sample_vector_chunk.doc_id),
+            "chunk_id": sample_vector_chunk.chunk_id,
+            "content": sample_vector_chunk.content
+        }])
+        query = mock_db_client.client.table.return_value.select.return_value
+        
+        result = mock_db_client.get_document_vectors_preview(sample_vector_chunk.doc_id, limit=3)
+        
+        assert len(result) == 1
+        assert result[0].content == sample_vector_chunk.content
+        assert result[0].embedding is None
+        mock_db_client.client.table.return_value.select.assert_called_once_with("id,doc_id,chunk_id,content")
+        query.eq.return_value.order.return_value.limit.assert_called_once_with(3)
+    
+    def test_get_all_document_stats(self, mock_db_client, wire_chain):
+        """Test fetching stats for all documents in one aggregate call."""
+        doc_id = uuid4()
+        wire_chain(mock_db_client.client, "rpc.execute", [{
+            "doc_id": str(doc_id),
+            "chunk_count": 2,
+            "total_content_length": 720,
+            "has_embeddings": True
+        }])
+        
+        result = mock_db_client.get_all_document_stats()
+        
+        assert result == {
+            str(doc_id): {
+                "chunk_count": 2,
+                "total_content_length": 720,
+                "has_embeddings": True
+            }
+        }
+        mock_db_client.client.rpc.assert_called_once_with("document_stats", {})
+    
+    def test_get_document_stats(self, mock_db_client, wire_chain):
+        """Test fetching stats for one document without downloading its chunks."""
+        doc_id = uuid4()
+        wire_chain(mock_db_client.client, "rpc.execute", [{
+            "doc_id": str(doc_id),
+            "chunk_count": 2,
+            "total_content_length": 720,
+            "has_embeddings": True
+        }])
+        
+        result = mock_db_client.get_document_stats(doc_id)
+        
+        assert result == {
+            "chunk_count": 2,
+            "total_content_length": 720,
+            "has_embeddings": True
+        }
+        mock_db_client.client.rpc.assert_called_once_with("document_stats", {"p_doc_id": str(doc_id)})
 
 
 class TestChatOperations:
     """Test cases for chat history operations."""
     
-    def test_store_chat_message(self, mock_db_client, sample_chat_message):
+    def test_store_chat_message(self, mock_db_client, wire_chain, sample_chat_message, sample_chat_message_row):
         """Test storing a chat message."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_chat_message.id),
-            "session_id": sample_chat_message.session_id,
-            "turn_index": sample_chat_message.turn_index,
-            "user_message": sample_chat_message.user_message,
-            "ai_response": sample_chat_message.ai_response,
-            "created_at": sample_chat_message.created_at
-        }]
-        mock_db_client.client.table.return_value.insert.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.insert.execute", [sample_chat_message_row])
         
         result = mock_db_client.store_chat_message(sample_chat_message)
         
@@ -199,19 +265,10 @@ class TestChatOperations:
         assert result.user_message == sample_chat_message.user_message
         mock_db_client.client.table.assert_called_with("chat_histories")
     
-    def test_get_chat_history(self, mock_db_client, sample_chat_message):
+    def test_get_chat_history(self, mock_db_client, wire_chain, sample_chat_message, sample_chat_message_row):
         """Test retrieving chat history."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = [{
-            "id": str(sample_chat_message.id),
-            "session_id": sample_chat_message.session_id,
-            "turn_index": sample_chat_message.turn_index,
-            "user_message": sample_chat_message.user_message,
-            "ai_response": sample_chat_message.ai_response,
-            "created_at": sample_chat_message.created_at
-        }]
-        mock_db_client.client.table.return_value.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.select.eq.order.limit.execute", [sample_chat_message_row])
         
         result = mock_db_client.get_chat_history(sample_chat_message.session_id, limit=5)
         
@@ -220,12 +277,10 @@ class TestChatOperations:
         assert isinstance(result[0], ChatMessage)
         assert result[0].session_id == sample_chat_message.session_id
     
-    def test_clear_chat_history(self, mock_db_client, test_session_id):
+    def test_clear_chat_history(self, mock_db_client, wire_chain, test_session_id):
         """Test clearing chat history."""
         # Mock successful response
-        mock_response = Mock()
-        mock_response.data = []
-        mock_db_client.client.table.return_value.delete.return_value.eq.return_value.execute.return_value = mock_response
+        wire_chain(mock_db_client.client, "table.delete.eq.execute", [])
         
         result = mock_db_client.clear_chat_history(test_session_id)
         assert result is True
@@ -249,19 +304,32 @@ class TestGlobalClientFunctions:
             # Should only create one instance
             assert mock_client_class.call_count == 1
     
-    def test_init_db_client_success(self, mock_supabase_client):
+    def test_get_db_client_concurrent(self):
+        """Test that concurrent first calls share a single client."""
+        def slow_client():
+            time.sleep(0.01)  # Widen the window for a creation race
+            return Mock()
+        
+        with patch('src.db.SupabaseClient', side_effect=slow_client) as mock_client_class:
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                clients = list(executor.map(lambda _: get_db_client(), range(100)))
+        
+        assert len({id(client) for client in clients}) == 1
+        assert mock_client_class.call_count == 1
+    
+    def test_init_db_client_success(self, monkeypatch):
         """Test successful database client initialization."""
-        with patch('src.db.create_client', return_value=mock_supabase_client):
-            with patch('src.db.SupabaseClient.test_connection', return_value=True):
-                client = init_db_client()
-                assert client is not None
+        monkeypatch.setattr(SupabaseClient, "test_connection", lambda self: True)
+        
+        client = init_db_client()
+        assert client is not None
     
-    def test_init_db_client_failure(self, mock_supabase_client):
+    def test_init_db_client_failure(self, monkeypatch):
         """Test failed database client initialization."""
-        with patch('src.db.create_client', return_value=mock_supabase_client):
-            with patch('src.db.SupabaseClient.test_connection', return_value=False):
-                with pytest.raises(ConnectionError):
-                    init_db_client()
+        monkeypatch.setattr(SupabaseClient, "test_connection", lambda self: False)
+        
+        with pytest.raises(ConnectionError):
+            init_db_client()
 
 
 @pytest.mark.integration
@@ -272,12 +340,42 @@ class TestDatabaseIntegration:
     run with appropriate test database configuration.
     """
     
+    @pytest.fixture(scope="class")
+    def integration_client(self):
+        """One real client shared by the class, so connections are reused."""
+        return SupabaseClient()
+    
+    @pytest.fixture
+    def round_trips(self, monkeypatch):
+        """Record the duration of every PostgREST request made during a test.
+        
+        Set ARTIFICIAL_LATENCY_MS to add a fixed delay to each request, to see
+        how a change in round-trip count would behave on a slower network.
+        """
+        latency = float(os.getenv("ARTIFICIAL_LATENCY_MS", "0")) / 1000
+        durations = []
+        
+        def record(execute):
+            def timed_execute(builder, *args, **kwargs):
+                start = time.perf_counter()
+                if latency:
+                    time.sleep(latency)
+                try:
+                    return execute(builder, *args, **kwargs)
+                finally:
+                    durations.append(time.perf_counter() - start)
+            return timed_execute
+        
+        # Table queries and RPC calls execute through these two builders
+        for builder in (SyncQueryRequestBuilder, SyncSingleRequestBuilder):
+            monkeypatch.setattr(builder, "execute", record(builder.execute))
+        
+        return durations
+    
     @pytest.mark.integration
-    def test_real_database_connection(self):
+    def test_real_database_connection(self, integration_client):
         """Test actual database connection (requires real credentials)."""
-        from src.db import SupabaseClient
-        
-        client = SupabaseClient()
+        client = integration_client
         
         # Test connection
         assert client.test_connection() == True
@@ -287,13 +385,9 @@ class TestDatabaseIntegration:
         assert result is not None
     
     @pytest.mark.integration 
-    def test_full_document_workflow(self):
+    def test_full_document_workflow(self, integration_client, round_trips):
         """Test complete document workflow with real database."""
-        from src.db import SupabaseClient
-        from src.models import VectorChunk
-        import uuid
-        
-        client = SupabaseClient()
+        client = integration_client
         
         # 1. Create document
         doc = client.create_document("test_integration_doc.pdf")
@@ -301,29 +395,34 @@ class TestDatabaseIntegration:
         assert doc.filename == "test_integration_doc.pdf"
         
         try:
-            # 2. Insert vectors
-            vector_data = VectorChunk(
-                id=uuid.uuid4(),  # Will be ignored by database
-                doc_id=doc.id,
-                chunk_id=0,
-                content="This is test content for integration testing",
-                embedding=[0.1] * 1536,  # Mock embedding of correct dimension
-                metadata={"test": True}
-            )
-            success = client.insert_vectors([vector_data])
+            # 2. Insert all vectors in a single request
+            vectors = [
+                VectorChunk(
+                    id=uuid4(),  # Will be ignored by database
+                    doc_id=doc.id,
+                    chunk_id=i,
+                    content=f"This is test content for integration testing {i}",
+                    embedding=_DUMMY_EMBEDDING,
+                    metadata={"test": True}
+                )
+                for i in range(5)
+            ]
+            success = client.insert_vectors(vectors)
             assert success == True
             
             # 3. Search vectors
-            search_results = client.vector_search([0.1] * 1536, top_k=5)
+            search_results = client.vector_search(_DUMMY_EMBEDDING, top_k=5)
             assert len(search_results) >= 1
-            found_our_vector = any(v.content == "This is test content for integration testing" 
-                                 for v in search_results)
+            found_our_vector = any(v.doc_id == doc.id for v in search_results)
             assert found_our_vector
             
             # 4. Get document vectors
             doc_vectors = client.get_document_vectors(doc.id)
-            assert len(doc_vectors) >= 1
-            assert doc_vectors[0].content == "This is test content for integration testing"
+            assert [v.chunk_id for v in doc_vectors] == list(range(5))
+            assert doc_vectors[0].content == "This is test content for integration testing 0"
+            
+            # One request per step: create, insert, search, fetch
+            assert len(round_trips) == 4, f"round-trip durations: {round_trips}"
             
         finally:
             # Clean up: Delete document (should cascade to vectors)
@@ -331,33 +430,46 @@ class TestDatabaseIntegration:
             assert success == True
 
 
+# (method, args, mock call that fails) for the error propagation tests
+_EXCEPTION_CASES = [
+    ("create_document", ("test.pdf",),
+     lambda m: m.table.return_value.insert.return_value.execute),
+    ("list_documents", (),
+     lambda m: m.table.return_value.select.return_value.order.return_value.execute),
+    ("delete_document", (uuid4(),),
+     lambda m: m.table.return_value.delete.return_value.eq.return_value.execute),
+    ("insert_vectors",
+     ([VectorChunk(id=uuid4(), doc_id=uuid4(), chunk_id=0, content="test", embedding=_DUMMY_EMBEDDING)],),
+     lambda m: m.table.return_value.insert.return_value.execute),
+    ("vector_search", (_DUMMY_EMBEDDING,),
+     lambda m: m.rpc),
+    ("get_document_vectors", (uuid4(),),
+     lambda m: m.table.return_value.select.return_value.eq.return_value.order.return_value.execute),
+    ("store_chat_message",
+     (ChatMessage(session_id="test", turn_index=0, user_message="test user", ai_response="test ai"),),
+     lambda m: m.table.return_value.insert.return_value.execute),
+    ("get_chat_history", ("test_session",),
+     lambda m: m.table.return_value.select.return_value.eq.return_value.order.return_value.limit.return_value.execute),
+    ("clear_chat_history", ("test_session",),
+     lambda m: m.table.return_value.delete.return_value.eq.return_value.execute),
+]
+
+
 class TestErrorHandling:
     """Test error handling in database operations."""
 
-    def test_create_document_no_data_returned(self, mock_supabase_client):
+    def test_create_document_no_data_returned(self, mock_db_client, wire_chain):
         """Test create_document when no data is returned."""
         # Mock empty result
-        mock_response = Mock()
-        mock_response.data = []
-        mock_supabase_client.table.return_value.insert.return_value.execute.return_value = mock_response
-        
-        client = SupabaseClient()
-        client.client = mock_supabase_client  # Replace the real client with mock
+        wire_chain(mock_db_client.client, "table.insert.execute", [])
         
         with pytest.raises(ValueError, match="Failed to create document: no data returned"):
-            client.create_document("test.pdf")
+            mock_db_client.create_document("test.pdf")
 
-    def test_store_chat_message_no_data_returned(self, mock_supabase_client):
+    def test_store_chat_message_no_data_returned(self, mock_db_client, wire_chain):
         """Test store_chat_message when no data is returned."""
-        from src.models import ChatMessage
-        
-        # Mock empty result  
-        mock_response = Mock()
-        mock_response.data = []
-        mock_supabase_client.table.return_value.insert.return_value.execute.return_value = mock_response
-        
-        client = SupabaseClient()
-        client.client = mock_supabase_client  # Replace the real client with mock
+        # Mock empty result
+        wire_chain(mock_db_client.client, "table.insert.execute", [])
         
         message = ChatMessage(
             session_id="test",
@@ -367,115 +479,15 @@ class TestErrorHandling:
         )
         
         with pytest.raises(ValueError, match="Failed to store chat message: no data returned"):
-            client.store_chat_message(message)
+            mock_db_client.store_chat_message(message)
 
-    def test_create_document_exception(self, mock_supabase_client):
-        """Test create_document exception handling."""
-        mock_supabase_client.table.return_value.insert.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.create_document("test.pdf")
-
-    def test_get_document_exception(self, mock_supabase_client):
-        """Test get_document exception handling."""
-        from uuid import uuid4
-        mock_supabase_client.table.return_value.select.return_value.eq.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.get_document(uuid4())
-
-    def test_list_documents_exception(self, mock_supabase_client):
-        """Test list_documents exception handling."""
-        mock_supabase_client.table.return_value.select.return_value.order.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.list_documents()
-
-    def test_delete_document_exception(self, mock_supabase_client):
-        """Test delete_document exception handling."""
-        from uuid import uuid4
-        mock_supabase_client.table.return_value.delete.return_value.eq.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.delete_document(uuid4())
-
-    def test_insert_vectors_exception(self, mock_supabase_client):
-        """Test insert_vectors exception handling."""
-        from src.models import VectorChunk
-        from uuid import uuid4
-        
-        mock_supabase_client.table.return_value.insert.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        vector = VectorChunk(
-            id=uuid4(),
-            doc_id=uuid4(),
-            chunk_id=0,
-            content="test",
-            embedding=[0.1] * 1536
-        )
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.insert_vectors([vector])
-
-    def test_vector_search_exception(self, mock_supabase_client):
-        """Test vector_search exception handling."""
-        mock_supabase_client.rpc.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.vector_search([0.1] * 1536)
-
-    def test_get_document_vectors_exception(self, mock_supabase_client):
-        """Test get_document_vectors exception handling."""
-        from uuid import uuid4
-        mock_supabase_client.table.return_value.select.return_value.eq.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.get_document_vectors(uuid4())
-
-    def test_store_chat_message_exception(self, mock_supabase_client):
-        """Test store_chat_message exception handling."""
-        from src.models import ChatMessage
-        
-        mock_supabase_client.table.return_value.insert.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        message = ChatMessage(
-            session_id="test",
-            turn_index=0,
-            user_message="test user",
-            ai_response="test ai"
-        )
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.store_chat_message(message)
-
-    def test_get_chat_history_exception(self, mock_supabase_client):
-        """Test get_chat_history exception handling."""
-        mock_supabase_client.table.return_value.select.return_value.eq.return_value.order.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
-        
-        with pytest.raises(Exception, match="Database error"):
-            client.get_chat_history("test_session")
-
-    def test_clear_chat_history_exception(self, mock_supabase_client):
-        """Test clear_chat_history exception handling."""
-        mock_supabase_client.table.return_value.delete.return_value.eq.return_value.execute.side_effect = Exception("Database error")
-        
-        client = SupabaseClient()
+    @pytest.mark.parametrize(
+        "method, args, failing_call",
+        [pytest.param(*case, id=case[0]) for case in _EXCEPTION_CASES],
+    )
+    def test_operation_exception(self, mock_db_client, method, args, failing_call):
+        """Test that database errors are logged and re-raised."""
+        failing_call(mock_db_client.client).side_effect = Exception("Database error")
         
         with pytest.raises(Exception, match="Database error"):
-            client.clear_chat_history("test_session")
+            getattr(mock_db_client, method)(*args)
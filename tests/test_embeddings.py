@@ -2,6 +2,7 @@
 
 import pytest
 import asyncio
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, AsyncMock
 
 from src.embeddings import EmbeddingGenerator
@@ -13,19 +14,15 @@ class TestEmbeddingGenerator:
     @pytest.fixture
     def mock_openai_response(self):
         """Create mock OpenAI embedding response."""
-        mock_response = Mock()
-        mock_response.data = [Mock()]
-        mock_response.data[0].embedding = [0.1, 0.2, 0.3] * 512  # 1536 dimensions
+        mock_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2, 0.3] * 512)])  # 1536 dimensions
         return mock_response
     
     @pytest.fixture
     def mock_batch_openai_response(self):
         """Create mock OpenAI batch embedding response."""
-        mock_response = Mock()
-        mock_response.data = []
+        mock_response = SimpleNamespace(data=[])
         for i in range(3):
-            mock_item = Mock()
-            mock_item.embedding = [0.1 + i * 0.1, 0.2 + i * 0.1, 0.3 + i * 0.1] * 512
+            mock_item = SimpleNamespace(embedding=[0.1 + i * 0.1, 0.2 + i * 0.1, 0.3 + i * 0.1] * 512)
             mock_response.data.append(mock_item)
         return mock_response
     
@@ -170,11 +167,9 @@ class TestEmbeddingGenerator:
         """Test batch embedding generation with some empty texts."""
         mock_client = Mock()
         # Create response for 2 non-empty texts
-        mock_response = Mock()
-        mock_response.data = []
+        mock_response = SimpleNamespace(data=[])
         for i in range(2):
-            mock_item = Mock()
-            mock_item.embedding = [0.1 + i * 0.1] * 1536
+            mock_item = SimpleNamespace(embedding=[0.1 + i * 0.1] * 1536)
             mock_response.data.append(mock_item)
         mock_client.embeddings.create.return_value = mock_response
         mock_openai.return_value = mock_client
@@ -228,9 +223,7 @@ class TestEmbeddingGenerator:
         texts = ["Text one"]
         
         # Fix the mock to return correct response for single text
-        mock_single_response = Mock()
-        mock_single_response.data = [Mock()]
-        mock_single_response.data[0].embedding = [0.1] * 1536
+        mock_single_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1] * 1536)])
         
         mock_async_client.embeddings.create = AsyncMock(side_effect=[
             Exception("Async API Error"),
@@ -344,9 +337,7 @@ class TestEmbeddingGeneratorAsync:
     @patch('src.embeddings.OpenAI')
     async def test_async_concurrent_calls(self, mock_openai, mock_async_openai):
         """Test concurrent async embedding calls."""
-        mock_response = Mock()
-        mock_response.data = [Mock()]
-        mock_response.data[0].embedding = [0.1] * 1536
+        mock_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1] * 1536)])
         
         mock_async_client = Mock()
         mock_async_client.embeddings.create = AsyncMock(return_value=mock_response)
@@ -63,7 +63,7 @@ class TestDocumentIngestionPipeline:
         
         assert pipeline.tokenizer_model == "sentence-transformers/all-MiniLM-L6-v2"
         assert pipeline.embedding_model == "text-embedding-3-small"
-        assert pipeline.batch_size == 10
+        assert pipeline.batch_size == 64
         assert pipeline.converter is not None
         assert pipeline.chunker is not None
         assert pipeline.embedder is not None
@@ -121,6 +121,77 @@ class TestDocumentIngestionPipeline:
         mock_components['db'].create_document.assert_called_once()
         mock_components['db'].insert_vectors.assert_called_once()
     
+    def test_ingest_document_duplicate_content(self, mock_components, mock_document_record):
+        """Test content already in the library is not converted or embedded again."""
+        mock_components['db'].get_document_by_sha256.return_value = mock_document_record
+        
+        with patch('os.path.exists', return_value=True):
+            pipeline = DocumentIngestionPipeline()
+            result = pipeline.ingest_document("copy.pdf", content_sha256="ab" * 32)
+        
+        assert result.conversion_status == "duplicate"
+        assert result.doc_id == mock_document_record.id
+        assert result.chunks_created == 0
+        assert mock_document_record.filename in result.error_message
+        mock_components['db'].get_document_by_sha256.assert_called_once_with("ab" * 32)
+        mock_components['converter'].convert_document.assert_not_called()
+        mock_components['db'].create_document.assert_not_called()
+    
+    def test_ingest_document_partial_failure_keeps_digest_free(
+        self,
+        mock_components,
+        mock_docling_document,
+        mock_docling_chunks,
+        mock_document_record
+    ):
+        """Test a partly stored document is removed and never claims its digest."""
+        mock_components['db'].get_document_by_sha256.return_value = None
+        mock_components['converter'].convert_document.return_value = mock_docling_document
+        mock_components['converter'].validate_document.return_value = True
+        mock_components['chunker'].chunk_document.return_value = mock_docling_chunks
+        mock_components['chunker'].contextualize_chunk.side_effect = lambda chunk: chunk.text
+        mock_components['chunker'].get_chunk_metadata.return_value = {'test': 'metadata'}
+        mock_components['embedder'].generate_embeddings.side_effect = [
+            [[0.1] * 1536] * 2,
+            Exception("Rate limited"),
+        ]
+        mock_components['db'].create_document.return_value = mock_document_record
+        
+        with patch('os.path.exists', return_value=True):
+            pipeline = DocumentIngestionPipeline(batch_size=2)
+            result = pipeline.ingest_document("test.pdf", content_sha256="ab" * 32)
+        
+        assert result.conversion_status == "failed"
+        mock_components['db'].set_document_sha256.assert_not_called()
+        mock_components['db'].delete_document.assert_called_once_with(mock_document_record.id)
+    
+    def test_ingest_document_concurrent_duplicate(
+        self,
+        mock_components,
+        mock_docling_document,
+        mock_docling_chunks,
+        mock_document_record
+    ):
+        """Test an upload that loses the digest to a concurrent upload reports a duplicate."""
+        winner = Document(id=uuid4(), filename="first.pdf", uploaded_at="2024-01-01T00:00:00Z")
+        mock_components['db'].get_document_by_sha256.side_effect = [None, winner]
+        mock_components['converter'].convert_document.return_value = mock_docling_document
+        mock_components['converter'].validate_document.return_value = True
+        mock_components['chunker'].chunk_document.return_value = mock_docling_chunks
+        mock_components['chunker'].contextualize_chunk.side_effect = lambda chunk: chunk.text
+        mock_components['chunker'].get_chunk_metadata.return_value = {'test': 'metadata'}
+        mock_components['embedder'].generate_embeddings.return_value = [[0.1] * 1536] * 3
+        mock_components['db'].create_document.return_value = mock_document_record
+        mock_components['db'].set_document_sha256.return_value = False
+        
+        with patch('os.path.exists', return_value=True):
+            pipeline = DocumentIngestionPipeline()
+            result = pipeline.ingest_document("test.pdf", content_sha256="ab" * 32)
+        
+        assert result.conversion_status == "duplicate"
+        assert result.doc_id == winner.id
+        mock_components['db'].delete_document.assert_called_once_with(mock_document_record.id)
+    
     def test_ingest_document_file_not_exists(self, mock_components):
         """Test ingestion with non-existent file."""
         pipeline = DocumentIngestionPipeline()
@@ -225,16 +296,16 @@ class TestDocumentIngestionPipeline:
         assert mock_components['embedder'].generate_embeddings.call_count == 3
         assert mock_components['db'].insert_vectors.call_count == 3
     
-    def test_process_and_store_chunks_batch_failure_continues(
+    def test_process_and_store_chunks_batch_failure_fails(
         self, 
         mock_components, 
         mock_docling_chunks, 
         mock_document_record
     ):
-        """Test that batch failure doesn't stop processing of other batches."""
+        """Test that a failed batch fails the whole chunk processing."""
         mock_components['chunker'].contextualize_chunk.side_effect = lambda chunk: chunk.text
         mock_components['chunker'].get_chunk_metadata.return_value = {'test': 'metadata'}
-        # First batch fails, second succeeds
+        # First batch fails, second would succeed
         mock_components['embedder'].generate_embeddings.side_effect = [
             Exception("Embedding failed"),
             [[0.1] * 1536] * 2
@@ -243,12 +314,12 @@ class TestDocumentIngestionPipeline:
         
         # Use small batch size to create multiple batches
         pipeline = DocumentIngestionPipeline(batch_size=2)
-        stored_count = pipeline._process_and_store_chunks(mock_document_record.id, mock_docling_chunks)
+        with pytest.raises(RuntimeError, match="Embedding failed"):
+            pipeline._process_and_store_chunks(mock_document_record.id, mock_docling_chunks)
         
-        # Should have processed second batch successfully (1 chunk after first batch failed)
-        assert stored_count == 1
-        assert mock_components['embedder'].generate_embeddings.call_count == 2
-        assert mock_components['db'].insert_vectors.call_count == 1
+        # Later batches are not attempted
+        assert mock_components['embedder'].generate_embeddings.call_count == 1
+        mock_components['db'].insert_vectors.assert_not_called()
     
     def test_validate_file_success(self, mock_components):
         """Test successful file validation."""
@@ -8,11 +8,15 @@ Author: RAG AI Agent Team
 Date: 2024-12-19
 """
 
+import asyncio
 import pytest
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, AsyncMock
 from datetime import datetime, timezone
 import uuid
 
+from postgrest.exceptions import APIError
+
 from src.memory import (
     ChatMemoryManager, 
     get_chat_memory, 
@@ -51,9 +55,7 @@ class TestChatMemoryManager:
         session_id = "test-session-123"
         
         # Mock database response
-        import uuid
-        mock_response = Mock()
-        mock_response.data = [
+        mock_response = SimpleNamespace(data=[
             {
                 'id': str(uuid.uuid4()),
                 'session_id': session_id,
@@ -70,7 +72,7 @@ class TestChatMemoryManager:
                 'ai_response': 'Hello! How can I help you?',
                 'created_at': '2024-01-01T00:00:00Z'
             }
-        ]
+        ])
         
         # Setup mock chain
         table_mock = mock_supabase_client.client.table.return_value
@@ -99,8 +101,7 @@ class TestChatMemoryManager:
         """Test chat memory retrieval with no history."""
         session_id = "new-session-123"
         
-        mock_response = Mock()
-        mock_response.data = []
+        mock_response = SimpleNamespace(data=[])
         
         table_mock = mock_supabase_client.client.table.return_value
         table_mock.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = mock_response
@@ -117,8 +118,7 @@ class TestChatMemoryManager:
         ai_response = "Python is a programming language."
         
         # Mock successful insert response
-        mock_response = Mock()
-        mock_response.data = [{'id': 'turn-123'}]
+        mock_response = SimpleNamespace(data=[{'id': 'turn-123'}])
         
         table_mock = mock_supabase_client.client.table.return_value
         table_mock.insert.return_value.execute.return_value = mock_response
@@ -129,18 +129,68 @@ class TestChatMemoryManager:
 
         await memory_manager.store_chat_turn(session_id, user_message, ai_response)
 
-        # Verify database insert was called
+        # The turn is buffered, not written inline
+        table_mock.insert.assert_not_called()
+        
+        await memory_manager.flush()
+
+        # Verify a single batched insert was issued
         table_mock.insert.assert_called_once()
         insert_args = table_mock.insert.call_args[0][0]
         
         # Verify turn record structure
-        assert insert_args['session_id'] == session_id
-        assert insert_args['turn_index'] == 0
-        assert insert_args['user_message'] == user_message
-        assert insert_args['ai_response'] == ai_response
+        assert len(insert_args) == 1
+        assert insert_args[0]['session_id'] == session_id
+        assert insert_args[0]['turn_index'] == 0
+        assert insert_args[0]['user_message'] == user_message
+        assert insert_args[0]['ai_response'] == ai_response
+        assert 'id' not in insert_args[0]  # Assigned by the database
+        assert 'created_at' not in insert_args[0]
         
         # Verify cleanup was called
-        memory_manager._cleanup_old_messages.assert_called_once_with(session_id)
+        memory_manager._cleanup_old_messages.assert_called_once_with(session_id, 0)
+
+    @pytest.mark.asyncio
+    async def test_store_chat_turn_background_flush(self, memory_manager, mock_supabase_client):
+        """Test that buffered turns are coalesced into one background insert."""
+        session_id = "test-session-123"
+        
+        mock_response = SimpleNamespace(data=[{'id': 'turn-0'}, {'id': 'turn-1'}])
+        
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.insert.return_value.execute.return_value = mock_response
+        
+        memory_manager._cleanup_old_messages = AsyncMock()
+        memory_manager._get_next_turn_index = AsyncMock(side_effect=[0, 1])
+
+        await memory_manager.store_chat_turn(session_id, "first", "first reply")
+        await memory_manager.store_chat_turn(session_id, "second", "second reply")
+        
+        await asyncio.sleep(memory_manager.WRITE_FLUSH_DELAY_SECONDS * 4)
+
+        table_mock.insert.assert_called_once()
+        insert_args = table_mock.insert.call_args[0][0]
+        assert [record['turn_index'] for record in insert_args] == [0, 1]
+
+    @pytest.mark.asyncio
+    async def test_get_next_turn_index(self, memory_manager, mock_supabase_client):
+        """Test next turn index lookup through the scalar RPC."""
+        mock_supabase_client.client.rpc.return_value.execute.return_value = Mock(data=3)
+
+        result = await memory_manager._get_next_turn_index("test-session-123")
+
+        assert result == 3
+        mock_supabase_client.client.rpc.assert_called_once_with(
+            "next_turn_index", {"p_session_id": "test-session-123"}
+        )
+
+    @pytest.mark.asyncio
+    async def test_get_next_turn_index_failure(self, memory_manager, mock_supabase_client):
+        """Test that turn index lookup errors are not masked as turn 0."""
+        mock_supabase_client.client.rpc.return_value.execute.side_effect = Exception("Connection reset")
+
+        with pytest.raises(Exception, match="Connection reset"):
+            await memory_manager._get_next_turn_index("test-session-123")
 
     @pytest.mark.asyncio
     async def test_store_chat_turn_failure(self, memory_manager, mock_supabase_client):
@@ -148,8 +198,7 @@ class TestChatMemoryManager:
         session_id = "test-session-123"
         
         # Mock insert failure
-        mock_response = Mock()
-        mock_response.data = []  # Empty response indicates failure
+        mock_response = SimpleNamespace(data=[])  # Empty response indicates failure
         
         table_mock = mock_supabase_client.client.table.return_value
         table_mock.insert.return_value.execute.return_value = mock_response
@@ -157,9 +206,153 @@ class TestChatMemoryManager:
         # Mock turn index helper
         memory_manager._get_next_turn_index = AsyncMock(return_value=0)
 
+        await memory_manager.store_chat_turn(session_id, "user msg", "ai msg")
+        
         with pytest.raises(Exception, match="Failed to store conversation turn"):
-            await memory_manager.store_chat_turn(session_id, "user msg", "ai msg")
+            await memory_manager.flush()
 
+    @pytest.mark.asyncio
+    async def test_flush_failure_keeps_pending_turns(self, memory_manager, mock_supabase_client):
+        """Test that turns stay buffered with their indexes when the insert fails."""
+        session_id = "test-session-123"
+
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.insert.return_value.execute.side_effect = Exception("Connection reset")
+
+        memory_manager._cleanup_old_messages = AsyncMock()
+        memory_manager._get_next_turn_index = AsyncMock(side_effect=[0, 1])
+
+        await memory_manager.store_chat_turn(session_id, "first", "first reply")
+        await memory_manager.store_chat_turn(session_id, "second", "second reply")
+
+        with pytest.raises(Exception, match="Connection reset"):
+            await memory_manager.flush()
+
+        pending = memory_manager._get_pending_turns(session_id)
+        assert [record['turn_index'] for record in pending] == [0, 1]
+        assert memory_manager._next_turn_indexes[session_id] == 2
+
+        # The next flush retries the same turns
+        table_mock.insert.return_value.execute.side_effect = None
+        table_mock.insert.return_value.execute.return_value = SimpleNamespace(data=[{'id': 'turn-0'}])
+
+        await memory_manager.flush()
+
+        insert_args = table_mock.insert.call_args[0][0]
+        assert [record['turn_index'] for record in insert_args] == [0, 1]
+        assert memory_manager._get_pending_turns(session_id) == []
+
+    @pytest.mark.asyncio
+    async def test_flush_drops_rejected_turns(self, memory_manager, mock_supabase_client):
+        """Test that a batch the database rejects is dropped instead of blocking the buffer."""
+        session_id = "test-session-123"
+
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.insert.return_value.execute.side_effect = APIError(
+            {"code": "23505", "message": "duplicate key value violates unique constraint"}
+        )
+
+        memory_manager._cleanup_old_messages = AsyncMock()
+        memory_manager._get_next_turn_index = AsyncMock(return_value=0)
+
+        await memory_manager.store_chat_turn(session_id, "first", "first reply")
+        await memory_manager.flush()
+
+        assert memory_manager._get_pending_turns(session_id) == []
+        # The stale index is forgotten so the next turn re-reads it
+        assert session_id not in memory_manager._next_turn_indexes
+        memory_manager._cleanup_old_messages.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_flush_failure_schedules_retry(self, memory_manager, mock_supabase_client):
+        """Test that turns left by a failed flush are retried without a new write."""
+        session_id = "test-session-123"
+
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.insert.return_value.execute.side_effect = [
+            Exception("Connection reset"),
+            SimpleNamespace(data=[{'id': 'turn-0'}]),
+        ]
+
+        memory_manager._cleanup_old_messages = AsyncMock()
+        memory_manager._get_next_turn_index = AsyncMock(return_value=0)
+
+        await memory_manager.store_chat_turn(session_id, "first", "first reply")
+        with pytest.raises(Exception, match="Connection reset"):
+            await memory_manager.flush()
+
+        await asyncio.sleep(memory_manager._retry_delay * 4)
+
+        assert table_mock.insert.call_count == 2
+        assert memory_manager._get_pending_turns(session_id) == []
+        assert memory_manager._retry_delay == memory_manager.WRITE_FLUSH_DELAY_SECONDS
+
+    def test_next_turn_indexes_are_bounded(self, memory_manager):
+        """Test that cached turn indexes evict idle sessions but keep ones with pending turns."""
+        memory_manager.MAX_TRACKED_SESSIONS = 2
+        memory_manager._pending_turns = [{'session_id': "busy", 'turn_index': 0}]
+
+        with memory_manager._buffer_lock:
+            memory_manager._remember_next_turn_index("busy", 1)
+            memory_manager._remember_next_turn_index("idle", 4)
+            memory_manager._remember_next_turn_index("new", 0)
+
+        assert list(memory_manager._next_turn_indexes) == ["busy", "new"]
+
+    @pytest.mark.asyncio
+    async def test_get_chat_memory_includes_pending_turns(self, memory_manager, mock_supabase_client):
+        """Test that buffered turns are returned before they are flushed."""
+        session_id = "test-session-123"
+        
+        mock_response = SimpleNamespace(data=[])
+        
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = mock_response
+        
+        memory_manager._get_next_turn_index = AsyncMock(return_value=0)
+        await memory_manager.store_chat_turn(session_id, "Hello", "Hi there!")
+
+        result = await memory_manager.get_chat_memory(session_id)
+
+        assert len(result) == 1
+        assert result[0].user_message == "Hello"
+        assert result[0].turn_index == 0
+
+    @pytest.mark.asyncio
+    async def test_get_chat_memory_after(self, memory_manager, mock_supabase_client):
+        """Test that only turns newer than the given time are requested."""
+        session_id = "test-session-123"
+        after = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        
+        table_mock = mock_supabase_client.client.table.return_value
+        eq_mock = table_mock.select.return_value.eq.return_value
+        eq_mock.gt.return_value.order.return_value.limit.return_value.execute.return_value = Mock(data=[])
+
+        result = await memory_manager.get_chat_memory(session_id, after=after)
+
+        assert result == []
+        eq_mock.gt.assert_called_once_with("created_at", after.isoformat())
+
+    @pytest.mark.asyncio
+    async def test_get_chat_memory_token_budget(self, memory_manager, mock_supabase_client):
+        """Test that only the newest turns fitting the token budget are returned."""
+        session_id = "test-session-123"
+        
+        mock_response = SimpleNamespace(data=[
+            {'id': None, 'session_id': session_id, 'turn_index': 2, 'user_message': 'c',
+             'ai_response': 'c', 'token_count': 40, 'created_at': '2024-01-03T00:00:00Z'},
+            {'id': None, 'session_id': session_id, 'turn_index': 1, 'user_message': 'b',
+             'ai_response': 'b', 'token_count': 50, 'created_at': '2024-01-02T00:00:00Z'},
+            {'id': None, 'session_id': session_id, 'turn_index': 0, 'user_message': 'a',
+             'ai_response': 'a', 'token_count': 30, 'created_at': '2024-01-01T00:00:00Z'},
+        ])
+        
+        table_mock = mock_supabase_client.client.table.return_value
+        table_mock.select.return_value.eq.return_value.order.return_value.limit.return_value.execute.return_value = mock_response
+
+        result = await memory_manager.get_chat_memory(session_id, token_budget=100)
+
+        assert [turn.turn_index for turn in result] == [1, 2]
 
     @pytest.mark.asyncio
     async def test_clear_session_memory_success(self, memory_manager, mock_supabase_client):
@@ -183,33 +376,19 @@ class TestChatMemoryManager:
         session_id = "test-session-123"
         memory_manager.memory_limit = 2  # Keep only 2 turns
         
-        # Mock turns beyond limit
-        mock_response = Mock()
-        mock_response.data = [
-            {'id': 'turn-4', 'turn_index': 4},
-            {'id': 'turn-3', 'turn_index': 3},
-            {'id': 'turn-2', 'turn_index': 2},  # Should be deleted
-            {'id': 'turn-1', 'turn_index': 1},  # Should be deleted
-            {'id': 'turn-0', 'turn_index': 0},  # Should be deleted
-        ]
-        
         table_mock = mock_supabase_client.client.table.return_value
         
-        # Mock select query
-        select_mock = table_mock.select.return_value
-        eq_mock = select_mock.eq.return_value
-        order_mock = eq_mock.order.return_value
-        order_mock.execute.return_value = mock_response
-        
         # Mock delete query
         delete_mock = table_mock.delete.return_value
-        in_mock = delete_mock.in_.return_value
-        in_mock.execute.return_value = Mock()
+        eq_mock = delete_mock.eq.return_value
+        eq_mock.lt.return_value.execute.return_value = Mock()
 
-        await memory_manager._cleanup_old_messages(session_id)
+        await memory_manager._cleanup_old_messages(session_id, 4)
 
-        # Verify cleanup deleted old turns
-        delete_mock.in_.assert_called_once_with("id", ['turn-2', 'turn-1', 'turn-0'])
+        # Verify a single range delete removed turns 0-2 without a pre-check select
+        delete_mock.eq.assert_called_once_with("session_id", session_id)
+        eq_mock.lt.assert_called_once_with("turn_index", 3)
+        table_mock.select.assert_not_called()
 
     @pytest.mark.asyncio
     async def test_cleanup_old_messages_no_cleanup_needed(self, memory_manager, mock_supabase_client):
@@ -217,17 +396,9 @@ class TestChatMemoryManager:
         session_id = "test-session-123"
         memory_manager.memory_limit = 5
         
-        # Mock fewer turns than limit
-        mock_response = Mock()
-        mock_response.data = [
-            {'id': 'turn-1', 'turn_index': 1},
-            {'id': 'turn-0', 'turn_index': 0},
-        ]
-        
         table_mock = mock_supabase_client.client.table.return_value
-        table_mock.select.return_value.eq.return_value.order.return_value.execute.return_value = mock_response
 
-        await memory_manager._cleanup_old_messages(session_id)
+        await memory_manager._cleanup_old_messages(session_id, 1)
 
         # Verify no delete was called
         table_mock.delete.assert_not_called()
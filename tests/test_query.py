@@ -9,6 +9,8 @@ Date: 2024-12-19
 """
 
 import pytest
+import uuid
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, AsyncMock
 from typing import List
 
@@ -48,8 +50,7 @@ class TestQueryProcessor:
     async def test_embed_query_success(self, query_processor):
         """Test successful query embedding generation."""
         # Mock OpenAI response
-        mock_response = Mock()
-        mock_response.data = [Mock(embedding=[0.1, 0.2, 0.3] * 512)]  # 1536 dimensions
+        mock_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2, 0.3] * 512)])  # 1536 dimensions
         query_processor.openai_client.embeddings.create.return_value = mock_response
 
         query = "What is machine learning?"
@@ -67,8 +68,7 @@ class TestQueryProcessor:
     async def test_embed_query_caching(self, query_processor):
         """Test that query embeddings are cached."""
         # Mock OpenAI response
-        mock_response = Mock()
-        mock_response.data = [Mock(embedding=[0.1, 0.2, 0.3] * 512)]
+        mock_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2, 0.3] * 512)])
         query_processor.openai_client.embeddings.create.return_value = mock_response
 
         query = "What is machine learning?"
@@ -83,6 +83,20 @@ class TestQueryProcessor:
         # OpenAI should only be called once due to caching
         query_processor.openai_client.embeddings.create.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_embed_query_cache_eviction(self, query_processor):
+        """Test that the embedding cache evicts the least recently used query."""
+        mock_response = SimpleNamespace(data=[SimpleNamespace(embedding=[0.1, 0.2, 0.3] * 512)])
+        query_processor.openai_client.embeddings.create.return_value = mock_response
+        query_processor.EMBEDDING_CACHE_SIZE = 2
+
+        await query_processor.embed_query("first")
+        await query_processor.embed_query("second")
+        await query_processor.embed_query("first")  # Refresh "first"
+        await query_processor.embed_query("third")
+
+        assert list(query_processor._embedding_cache) == ["first", "third"]
+
     @pytest.mark.asyncio
     async def test_embed_query_failure(self, query_processor):
         """Test handling of embedding generation failure."""
@@ -95,9 +109,7 @@ class TestQueryProcessor:
     async def test_vector_search_success(self, query_processor):
         """Test successful vector similarity search."""
         # Mock Supabase response
-        mock_response = Mock()
-        import uuid
-        mock_response.data = [
+        mock_response = SimpleNamespace(data=[
             {
                 'id': str(uuid.uuid4()),
                 'doc_id': str(uuid.uuid4()),
@@ -116,7 +128,7 @@ class TestQueryProcessor:
                 'embedding': [0.2] * 1536,
                 'similarity': 0.75
             }
-        ]
+        ])
         query_processor.supabase_client.client.rpc.return_value.execute.return_value = mock_response
 
         query_embedding = [0.1] * 1536
@@ -138,11 +150,31 @@ class TestQueryProcessor:
             }
         )
 
+    @pytest.mark.asyncio
+    async def test_vector_search_rows_without_embeddings(self, query_processor):
+        """Test that search rows without an embedding column still parse."""
+        mock_response = SimpleNamespace(data=[
+            {
+                'id': str(uuid.uuid4()),
+                'doc_id': str(uuid.uuid4()),
+                'chunk_id': 0,
+                'content': 'Test content',
+                'metadata': {'filename': 'test.pdf'},
+                'similarity': 0.9
+            }
+        ])
+        query_processor.supabase_client.client.rpc.return_value.execute.return_value = mock_response
+
+        results = await query_processor.vector_search([0.1] * 1536, top_k=1, similarity_threshold=0.7)
+
+        assert len(results) == 1
+        assert results[0].content == 'Test content'
+        assert results[0].embedding is None
+
     @pytest.mark.asyncio
     async def test_vector_search_no_results(self, query_processor):
         """Test vector search with no results."""
-        mock_response = Mock()
-        mock_response.data = []
+        mock_response = SimpleNamespace(data=[])
         query_processor.supabase_client.client.rpc.return_value.execute.return_value = mock_response
 
         query_embedding = [0.1] * 1536
@@ -166,7 +198,6 @@ class TestQueryProcessor:
         query_processor.embed_query = AsyncMock(return_value=mock_embedding)
 
         # Mock vector search
-        import uuid
         mock_chunks = [
             VectorChunk(
                 id=uuid.uuid4(),
@@ -6,10 +6,11 @@ testing authentication, file upload, document management, and chat interface.
 """
 
 import pytest
+import io
 import tempfile
 import os
 from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 from datetime import datetime
 import uuid
 
@@ -50,6 +51,7 @@ mock_streamlit.bar_chart = MagicMock()
 mock_streamlit.code = MagicMock()
 mock_streamlit.rerun = MagicMock()
 mock_streamlit.set_page_config = MagicMock()
+mock_streamlit.fragment = lambda func: func
 
 # Mock the context managers
 mock_streamlit.form = lambda *args, **kwargs: MagicMock().__enter__()
@@ -67,6 +69,7 @@ from src.ui.document_manager import DocumentManager, render_document_manager
 from src.ui.chat_interface import ChatInterfaceManager, render_chat_interface
 from src.models import Document, VectorChunk, ChatMessage
 from src.ingest import ConversionResult
+from src.config import settings
 
 
 class TestAuthManager:
@@ -159,6 +162,21 @@ class TestAuthManager:
         assert "invalid" in message.lower()
         assert user_data is None
     
+    @patch('src.ui.auth._auth_executor')
+    def test_sign_in_timeout(self, mock_executor):
+        """Test sign in when the auth round-trip times out."""
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+        
+        mock_executor.submit.return_value.result.side_effect = FutureTimeoutError()
+        
+        success, message, user_data = self.auth_manager.sign_in("test@example.com", "password123")
+        
+        assert success is False
+        assert user_data is None
+        mock_executor.submit.return_value.result.assert_called_once_with(
+            timeout=settings.supabase_timeout_seconds
+        )
+    
     def test_sign_out(self):
         """Test user sign out."""
         success, message = self.auth_manager.sign_out()
@@ -219,9 +237,9 @@ class TestFileUploadManager:
     
     def test_save_uploaded_file(self):
         """Test saving uploaded file to temporary directory."""
-        mock_file = Mock()
+        mock_file = io.BytesIO(b"fake pdf content")
         mock_file.name = "test.pdf"
-        mock_file.getbuffer.return_value = b"fake pdf content"
+        mock_file.read(4)  # Position must not affect what is saved
         
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
@@ -232,6 +250,24 @@ class TestFileUploadManager:
             assert saved_path.name == "test.pdf"
             assert saved_path.read_bytes() == b"fake pdf content"
     
+    def test_save_uploaded_file_same_name(self):
+        """Test files uploaded under the same name are saved to distinct paths."""
+        first = io.BytesIO(b"first content")
+        first.name = "report.pdf"
+        second = io.BytesIO(b"second content")
+        second.name = "report.pdf"
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+            
+            first_path = self.upload_manager.save_uploaded_file(first, temp_path)
+            second_path = self.upload_manager.save_uploaded_file(second, temp_path)
+            
+            assert first_path != second_path
+            assert first_path.name == second_path.name == "report.pdf"
+            assert first_path.read_bytes() == b"first content"
+            assert second_path.read_bytes() == b"second content"
+    
     @patch('src.ui.file_upload.DocumentIngestionPipeline')
     def test_process_file_success(self, mock_pipeline_class):
         """Test successful file processing."""
@@ -308,34 +344,35 @@ class TestDocumentManager:
         """Test getting document statistics."""
         doc_id = str(uuid.uuid4())
         
-        # Mock chunks
-        mock_chunks = [
-            VectorChunk(
-                id=uuid.uuid4(),
-                doc_id=uuid.UUID(doc_id),
-                chunk_id=1,
-                content="Content 1" * 50,  # 450 chars
-                embedding=[0.1] * 1536,
-                metadata={}
-            ),
-            VectorChunk(
-                id=uuid.uuid4(),
-                doc_id=uuid.UUID(doc_id),
-                chunk_id=2,
-                content="Content 2" * 30,  # 270 chars
-                embedding=[0.2] * 1536,
-                metadata={}
-            )
-        ]
-        
-        self.doc_manager.db_client.get_chunks_by_document.return_value = mock_chunks
+        self.doc_manager.db_client.get_document_stats.return_value = {
+            "chunk_count": 2,
+            "total_content_length": 720,
+            "has_embeddings": True
+        }
         
         stats = self.doc_manager.get_document_stats(doc_id)
         
         assert stats["chunk_count"] == 2
-        assert stats["total_content_length"] == 720  # 450 + 270
+        assert stats["total_content_length"] == 720
         assert stats["avg_chunk_length"] == 360  # 720 / 2
         assert stats["has_embeddings"] is True
+        self.doc_manager.db_client.get_document_vectors.assert_not_called()
+    
+    def test_get_document_stats_memoized(self):
+        """Test document statistics are fetched once per manager instance."""
+        doc_id = str(uuid.uuid4())
+        
+        self.doc_manager.db_client.get_document_stats.return_value = {
+            "chunk_count": 0,
+            "total_content_length": 0,
+            "has_embeddings": True
+        }
+        
+        first = self.doc_manager.get_document_stats(doc_id)
+        second = self.doc_manager.get_document_stats(doc_id)
+        
+        assert first == second
+        self.doc_manager.db_client.get_document_stats.assert_called_once_with(doc_id)
     
     def test_delete_document_success(self):
         """Test successful document deletion."""
@@ -364,8 +401,8 @@ class TestDocumentManager:
         """Test deleting multiple documents."""
         doc_ids = [str(uuid.uuid4()) for _ in range(3)]
         
-        # Mock success for first two, failure for third
-        self.doc_manager.db_client.delete_document.side_effect = [True, True, False]
+        # Bulk delete removes the first two, third is not found
+        self.doc_manager.db_client.delete_documents.return_value = doc_ids[:2]
         
         results = self.doc_manager.delete_multiple_documents(doc_ids)
         
@@ -373,6 +410,7 @@ class TestDocumentManager:
         assert len(results["successful"]) == 2
         assert len(results["failed"]) == 1
         assert results["failed"][0]["doc_id"] == doc_ids[2]
+        self.doc_manager.db_client.delete_documents.assert_called_once_with(doc_ids)
 
 
 class TestChatInterfaceManager:
@@ -380,8 +418,7 @@ class TestChatInterfaceManager:
     
     def setup_method(self):
         """Set up test fixtures."""
-        with patch('src.ui.chat_interface.ChatOrchestrator'), \
-             patch('src.ui.chat_interface.ChatMemoryManager'):
+        with patch('src.ui.chat_interface.ChatOrchestrator'):
             self.chat_manager = ChatInterfaceManager()
     
     @patch('src.ui.chat_interface.st')
@@ -473,29 +510,32 @@ class TestChatInterfaceManager:
         assert "error" in response["response"].lower()
         assert response["session_id"] == session_id
     
-    def test_store_chat_turn_success(self):
+    @pytest.mark.asyncio
+    async def test_store_chat_turn_success(self):
         """Test successful chat turn storage."""
         session_id = str(uuid.uuid4())
         user_message = "Hello"
         ai_response = "Hi there!"
+        self.chat_manager.memory_manager.store_chat_turn = AsyncMock()
         
-        success = self.chat_manager.store_chat_turn(session_id, user_message, ai_response)
+        success = await self.chat_manager.store_chat_turn(session_id, user_message, ai_response)
         
         assert success is True
-        self.chat_manager.memory_manager.store_chat_turn.assert_called_once_with(
+        self.chat_manager.memory_manager.store_chat_turn.assert_awaited_once_with(
             session_id, user_message, ai_response
         )
     
-    def test_store_chat_turn_failure(self):
+    @pytest.mark.asyncio
+    async def test_store_chat_turn_failure(self):
         """Test chat turn storage failure."""
         session_id = str(uuid.uuid4())
         user_message = "Hello"
         ai_response = "Hi there!"
         
         # Mock exception
-        self.chat_manager.memory_manager.store_chat_turn.side_effect = Exception("DB error")
+        self.chat_manager.memory_manager.store_chat_turn = AsyncMock(side_effect=Exception("DB error"))
         
-        success = self.chat_manager.store_chat_turn(session_id, user_message, ai_response)
+        success = await self.chat_manager.store_chat_turn(session_id, user_message, ai_response)
         
         assert success is False
     
@@ -513,6 +553,48 @@ class TestChatInterfaceManager:
         assert len(new_session_id) > 0
 
 
+class TestResponseCache:
+    """Test the cross-session cache of chat responses."""
+    
+    def _turn(self, user_message, ai_response):
+        return ChatMessage(session_id="s", turn_index=0, user_message=user_message, ai_response=ai_response)
+    
+    def test_state_key_changes_with_corpus(self):
+        """Test answers cached before an upload or delete are not served after it."""
+        from src.ui.chat_interface import _conversation_state_key
+        from src.ui.document_manager import clear_document_cache, get_corpus_version
+        
+        before = _conversation_state_key([], get_corpus_version())
+        clear_document_cache()
+        after = _conversation_state_key([], get_corpus_version())
+        
+        assert before != after
+    
+    def test_state_key_follows_chat_history(self):
+        """Test the key reflects the history the model sees, not the visible messages."""
+        from src.ui.chat_interface import _conversation_state_key
+        
+        history = [self._turn("Hi", "Hello!")]
+        
+        assert _conversation_state_key(history, 0) == _conversation_state_key(list(history), 0)
+        assert _conversation_state_key(history, 0) != _conversation_state_key([], 0)
+        assert _conversation_state_key(history, 0) != _conversation_state_key([self._turn("Hi", "Hey")], 0)
+    
+    def test_cache_round_trip_and_eviction(self):
+        """Test cached responses are returned and the oldest entry is evicted."""
+        from src.ui import chat_interface
+        
+        response = {"response": "Answer", "sources": []}
+        with patch.object(chat_interface, "_RESPONSE_CACHE_SIZE", 1), \
+                patch.object(chat_interface, "_response_cache", chat_interface.OrderedDict()):
+            chat_interface._cache_response("state-a", "query", response)
+            assert chat_interface._get_cached_response("state-a", "query") == response
+            assert chat_interface._get_cached_response("state-b", "query") is None
+            
+            chat_interface._cache_response("state-b", "query", response)
+            assert chat_interface._get_cached_response("state-a", "query") is None
+
+
 class TestRenderFunctions:
     """Test the render functions with mocked Streamlit."""
     
@@ -554,9 +636,9 @@ class TestRenderFunctions:
         
         assert result is False
     
-    @patch('src.ui.file_upload.FileUploadManager')
+    @patch('src.ui.file_upload.get_upload_manager')
     @patch('src.ui.file_upload.st')
-    def test_render_file_upload_no_files(self, mock_st, mock_file_manager_class):
+    def test_render_file_upload_no_files(self, mock_st, mock_get_upload_manager):
         """Test file upload render with no files."""
         mock_st.file_uploader.return_value = None
         